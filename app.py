@@ -1,4 +1,3 @@
-import joblib
 import pandas as pd
 import streamlit as st
 
@@ -7,15 +6,18 @@ from pneumonia_predictor.frontend.components import (
     display_banner,
     display_result,
 )
+from pneumonia_predictor.backend.compiled_forest import CompiledForest
 from pneumonia_predictor.backend.utils import format_input
+from pneumonia_predictor.config import FEATURE_COLUMNS, SAVED_MODELS
 
-PREDICTOR_RF_SMOTE = joblib.load("saved_models/pneumonia_predictor_rfsmote.pkl")
-PREDICTOR_RF_ACTIVE_SMOTE = joblib.load("saved_models/pneumonia_predictor.pkl")
+PREDICTOR_RF_SMOTE = CompiledForest.from_saved(SAVED_MODELS["RfSMOTE"])
+PREDICTOR_RF_ACTIVE_SMOTE = CompiledForest.from_saved(SAVED_MODELS["RfActiveSMOTE"])
 
 
-def predict(model, new_data: pd.DataFrame) -> None:
-    prediction = model.predict(new_data)[0]
-    probabilities = model.predict_proba(new_data)[0]
+def predict(model: CompiledForest, new_data: pd.DataFrame) -> None:
+    predictions, probabilities = model.predict_with_proba(new_data)
+    prediction = predictions[0]
+    probabilities = probabilities[0]
 
     with st.container(border=True):
         class_0_proba = round(probabilities[0] * 100, 2)
@@ -140,31 +142,7 @@ def main() -> None:
                     for cond in conditions:
                         st.checkbox(label=conditions[cond], key=cond)
 
-            _, X_input = format_input(
-                st.session_state,
-                [
-                    "age",
-                    "sex",
-                    "fatigue",
-                    "cough_phlegm",
-                    "chronic_resp_disease",
-                    "chronic_kidney_disease",
-                    "heart_failure",
-                    "cancer",
-                    "systoic_bp",
-                    "dias_bp",
-                    "pulse_rate",
-                    "resp_rate",
-                    "diabetes_mellitus",
-                    "hemoglobin",
-                    "platelets",
-                    "cough",
-                    "temp",
-                    "hematocrit",
-                    "rbc",
-                    "wbc",
-                ],
-            )
+            _, X_input = format_input(st.session_state, FEATURE_COLUMNS)
 
             if st.session_state.chosen_model == "RfSMOTE":
                 model = PREDICTOR_RF_SMOTE
@@ -0,0 +1,97 @@
+"""Wall time and macro-F1 of the clustering backends of `RfActiveSMOTE`, plus the
+clustering time alone on large minority sets.
+
+Usage: python -m benchmarks.clustering [--rows N] [--cluster-rows N ...]
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.cohort import make_cohort
+from pneumonia_predictor.backend.clustering import Clusterer
+from pneumonia_predictor.backend.rf_active_smote import RfActiveSMOTE
+from pneumonia_predictor.config import (
+    CATEG_FEATURES,
+    N_CLUSTERS,
+    N_ITERATIONS,
+    TARGET_NAME,
+)
+
+# (backend, warm start); the first one is the current default behavior
+SETUPS = [
+    ("kmeans", False),
+    ("kmeans", True),
+    ("minibatch", False),
+    ("minibatch", True),
+]
+
+
+def time_clustering(n_rows: int, n_iterations: int) -> None:
+    """Clusters a different random half of `n_rows` minority rows per iteration,
+    the way each iteration clusters a new uncertainty set
+    """
+    X, _ = make_cohort(n_rows)
+    for backend, warm_start in SETUPS:
+        clusterer = Clusterer(N_CLUSTERS, backend, warm_start)
+        start = time.perf_counter()
+        for i in range(n_iterations):
+            clusterer.fit(X.sample(frac=0.5, random_state=i))
+        elapsed = time.perf_counter() - start
+
+        name = f"{backend}{' (warm)' if warm_start else ''}"
+        print(f"{name:<22} {n_rows:>10} {elapsed:>14.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--minority-frac", type=float, default=0.3)
+    parser.add_argument("--iterations", type=int, default=N_ITERATIONS)
+    parser.add_argument(
+        "--cluster-rows", type=int, nargs="*", default=[100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'backend':<22} {'rows':>10} {'clustering (s)':>14}")
+    for n_rows in args.cluster_rows:
+        time_clustering(n_rows, args.iterations)
+    print()
+
+    X_train, y_train = make_cohort(args.rows, args.minority_frac)
+    X_test, y_test = make_cohort(args.rows // 4, args.minority_frac, seed=7)
+
+    print(f"{'backend':<22} {'clustering (s)':>14} {'train (s)':>10} {'macro F1':>9}")
+    for backend, warm_start in SETUPS:
+        model = RfActiveSMOTE(
+            X_train,
+            y_train,
+            X_test,
+            y_test,
+            TARGET_NAME,
+            CATEG_FEATURES,
+            clustering_backend=backend,
+            cluster_warm_start=warm_start,
+        )
+
+        cluster_times = []
+        fit_clusters = model.clusterer.fit
+
+        def timed_fit(X):
+            start = time.perf_counter()
+            labels = fit_clusters(X)
+            cluster_times.append(time.perf_counter() - start)
+            return labels
+
+        model.clusterer.fit = timed_fit
+        start = time.perf_counter()
+        model.train(args.iterations)
+        elapsed = time.perf_counter() - start
+
+        name = f"{backend}{' (warm)' if warm_start else ''}"
+        f1 = statistics.fmean(model.macro_avg["f1-score"])
+        print(f"{name:<22} {sum(cluster_times):>14.2f} {elapsed:>10.1f} {f1:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+from pandas import DataFrame
+
+from pneumonia_predictor.config import FEATURE_COLUMNS, TARGET_NAME
+
+# (low, high) ranges of the integer-valued and continuous measurements
+INT_RANGES = {
+    "age": (18, 95),
+    "systoic_bp": (80, 200),
+    "dias_bp": (40, 120),
+    "pulse_rate": (45, 150),
+    "resp_rate": (10, 45),
+    "hemoglobin": (70, 180),
+    "platelets": (50, 600),
+}
+FLOAT_RANGES = {
+    "temp": (35.0, 41.0),
+    "hematocrit": (20.0, 55.0),
+    "rbc": (2.5, 6.5),
+    "wbc": (2.0, 30.0),
+}
+
+
+def make_cohort(
+    n_rows: int,
+    minority_frac: float = 0.2,
+    seed: int = 42,
+    binary_rate: float = 0.3,
+    dtype: np.dtype = np.float64,
+) -> tuple[DataFrame, DataFrame]:
+    """Generate a synthetic cohort following the 20-feature schema of `app.py`,
+    where `minority_frac` of the rows are labeled as admitted.
+
+    Columns outside `INT_RANGES` and `FLOAT_RANGES` (sex and the symptoms and
+    comorbidities, including every `CATEG_FEATURES` position) are binary, set
+    with probability `binary_rate`.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for col in FEATURE_COLUMNS:
+        if col in INT_RANGES:
+            low, high = INT_RANGES[col]
+            columns[col] = rng.integers(low, high + 1, n_rows).astype(dtype)
+        elif col in FLOAT_RANGES:
+            low, high = FLOAT_RANGES[col]
+            columns[col] = rng.uniform(low, high, n_rows).round(1).astype(dtype)
+        else:
+            columns[col] = (rng.random(n_rows) < binary_rate).astype(dtype)
+    X = DataFrame(columns, columns=FEATURE_COLUMNS)
+
+    # Risk grows with age, fever, tachypnea, leukocytosis and comorbidities
+    risk = (
+        0.03 * X["age"]
+        + 0.8 * (X["temp"] - 37.0)
+        + 0.1 * (X["resp_rate"] - 20.0)
+        + 0.1 * (X["wbc"] - 10.0)
+        + X[["cough_phlegm", "chronic_resp_disease", "heart_failure", "cough"]].sum(
+            axis=1
+        )
+        + rng.normal(0.0, 1.5, n_rows)
+    )
+    y = DataFrame(
+        {TARGET_NAME: (risk > np.quantile(risk, 1 - minority_frac)).astype(np.float64)}
+    )
+    return X, y
@@ -0,0 +1,73 @@
+"""Latency of `CompiledForest` against `RandomForestClassifier` in `app.py` style
+(`predict` followed by `predict_proba`).
+
+Usage: python -m benchmarks.inference_latency [--model NAME --dataset NAME]
+"""
+
+import argparse
+import statistics
+import time
+
+import joblib
+import numpy as np
+from pandas import concat
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.cohort import make_cohort
+from pneumonia_predictor.backend.compiled_forest import CompiledForest
+from pneumonia_predictor.backend.data_fetcher import load_data
+from pneumonia_predictor.config import N_ESTIMATORS, SAVED_MODELS_PATH
+
+BATCH_SIZES = [1, 100, 100_000]
+
+
+def time_call(func, X, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(X)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", help="saved model name (default: train one)")
+    parser.add_argument("--dataset", help="test set name in the datasets folder")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.model:
+        classifier = joblib.load(f"{SAVED_MODELS_PATH}/{args.model}.pkl")
+    else:
+        X_train, y_train = make_cohort(20_000)
+        classifier = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=42)
+        classifier.fit(X_train, y_train.values.ravel())
+
+    X_test = load_data(args.dataset) if args.dataset else make_cohort(10_000, seed=7)[0]
+    compiled = CompiledForest(classifier)
+
+    identical = np.array_equal(
+        classifier.predict_proba(X_test), compiled.predict_proba(X_test)
+    )
+    print(f"predict_proba identical on test set ({len(X_test)} rows): {identical}")
+
+    def sklearn_predict(X):
+        classifier.predict(X)
+        classifier.predict_proba(X)
+
+    print(f"{'batch':>8} {'sklearn (ms)':>14} {'compiled (ms)':>14} {'speedup':>8}")
+    for batch_size in BATCH_SIZES:
+        n_copies = -(-batch_size // len(X_test))
+        X = concat([X_test] * n_copies, ignore_index=True).iloc[:batch_size]
+        repeats = args.repeats if batch_size < 10_000 else 1
+        baseline = time_call(sklearn_predict, X, repeats)
+        compiled_time = time_call(compiled.predict_with_proba, X, repeats)
+        print(
+            f"{batch_size:>8} {baseline * 1e3:>14.2f} {compiled_time * 1e3:>14.2f} "
+            + f"{baseline / compiled_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
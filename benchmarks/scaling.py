@@ -0,0 +1,230 @@
+"""Training time, peak memory and throughput of `RfSMOTE` and `RfActiveSMOTE`, per
+stage, as the cohort grows.
+
+Every (model, size) run happens in its own process, so peak RSS is measured
+per run and an out-of-memory kill only loses that run. Results are saved as
+JSON (one file per version), and `--compare` flags the stages that got slower
+or heavier than in a previous results file.
+
+Usage:
+    python -m benchmarks.scaling [--rows N ...] [--models RfSMOTE RfActiveSMOTE]
+        [--iterations N] [--trees N] [--timeout S] [--output FILE]
+        [--compare OLD_FILE] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.cohort import make_cohort
+from pneumonia_predictor.backend.profiler import Profiler, max_rss
+from pneumonia_predictor.backend.rf_active_smote import RfActiveSMOTE
+from pneumonia_predictor.backend.rf_smote import RfSMOTE
+from pneumonia_predictor.config import (
+    CATEG_FEATURES,
+    N_ESTIMATORS,
+    N_ITERATIONS,
+    TARGET_NAME,
+)
+
+MODELS = {"RfSMOTE": RfSMOTE, "RfActiveSMOTE": RfActiveSMOTE}
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_DIR = Path(__file__).parent / "results"
+MB = 1024**2
+NOISE_FLOOR = 0.05  # Seconds; smaller time differences are never regressions
+
+
+def run_once(model_name: str, n_rows: int, n_iterations: int, n_trees: int) -> dict:
+    """Trains `model_name` on an `n_rows` cohort, with a quarter as many test
+    rows, and returns its wall time, peak RSS and per-stage profile
+    """
+    X_train, y_train = make_cohort(n_rows)
+    X_test, y_test = make_cohort(max(n_rows // 4, 1), seed=7)
+
+    # RSS only (no tracemalloc): keeps timings honest
+    profiler = Profiler(enabled=True, track_memory=True, trace_allocations=False)
+    # The construction copies the training set, so it is a stage of its own (run 0)
+    with profiler.span(f"{model_name}.__init__", n_rows):
+        model = MODELS[model_name](
+            X_train,
+            y_train,
+            X_test,
+            y_test,
+            TARGET_NAME,
+            CATEG_FEATURES,
+            num_est=n_trees,
+        )
+    model.profiler = profiler
+
+    start = time.perf_counter()
+    if model_name == "RfActiveSMOTE":
+        model.train(n_iterations)
+    else:
+        model.train()
+    wall_time = time.perf_counter() - start
+
+    summary = model.profiler.summary()
+    return {
+        "model": model_name,
+        "rows": n_rows,
+        "status": "ok",
+        "wall_time": wall_time,
+        "rows_per_sec": n_rows / wall_time,
+        "peak_rss_mb": max_rss() / MB,
+        "stages": {
+            stage: {
+                "time": row["total"],
+                "calls": int(row["calls"]),
+                "rows_per_sec": row["rows_per_sec"],
+                "rss_mb": row["rss_mb"],
+                # High-water mark of the process at the end of the stage
+                "peak_rss_mb": row["max_rss_mb"],
+            }
+            for stage, row in summary.iterrows()
+        },
+    }
+
+
+def run_isolated(args: argparse.Namespace, model_name: str, n_rows: int) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.scaling",
+        "--worker",
+        model_name,
+        str(n_rows),
+        "--iterations",
+        str(args.iterations),
+        "--trees",
+        str(args.trees),
+    ]
+    failed = {"model": model_name, "rows": n_rows}
+    try:
+        proc = subprocess.run(
+            command, capture_output=True, text=True, timeout=args.timeout
+        )
+    except subprocess.TimeoutExpired:
+        return failed | {"status": f"timeout ({args.timeout}s)"}
+    if proc.returncode != 0:
+        # -9 is usually the OOM killer
+        return failed | {"status": f"failed (exit code {proc.returncode})"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: list[dict]) -> None:
+    for res in results:
+        header = f"{res['model']} @ {res['rows']:,} rows"
+        if res["status"] != "ok":
+            print(f"{header}: {res['status']}")
+            continue
+        print(
+            f"{header}: {res['wall_time']:.1f}s, {res['rows_per_sec']:,.0f} rows/s, "
+            + f"peak RSS {res['peak_rss_mb']:,.0f} MB"
+        )
+        for stage, st in res["stages"].items():
+            print(
+                f"    {stage:<24} {st['time']:>9.2f}s {st['rows_per_sec']:>14,.0f} "
+                + f"rows/s {st['rss_mb']:>9,.0f} MB (peak {st['peak_rss_mb']:,.0f} MB)"
+            )
+
+
+def compare(results: list[dict], old_path: str, tolerance: float) -> int:
+    """Prints the stages that are `tolerance` slower or heavier than in the old
+    results file and returns how many there are
+    """
+    old = {
+        (res["model"], res["rows"]): res
+        for res in json.loads(Path(old_path).read_text())["results"]
+        if res["status"] == "ok"
+    }
+    regressions = 0
+    print(f"\nCompared with {old_path} (tolerance {tolerance:.0%}):")
+    for res in results:
+        prev = old.get((res["model"], res["rows"]))
+        if res["status"] != "ok" or prev is None:
+            continue
+        checks = [("total", "time", res["wall_time"], prev["wall_time"])]
+        checks.append(("total", "peak RSS", res["peak_rss_mb"], prev["peak_rss_mb"]))
+        for stage, st in res["stages"].items():
+            if stage in prev["stages"]:
+                checks.append(
+                    (stage, "time", st["time"], prev["stages"][stage]["time"])
+                )
+        for stage, metric, new, before in checks:
+            noise = NOISE_FLOOR if metric == "time" else 0
+            if before > 0 and new > before * (1 + tolerance) + noise:
+                regressions += 1
+                print(
+                    f"    REGRESSION {res['model']} @ {res['rows']:,} rows, {stage} "
+                    + f"{metric}: {before:.2f} -> {new:.2f} ({new / before - 1:+.0%})"
+                )
+    if not regressions:
+        print("    no regressions")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--iterations", type=int, default=N_ITERATIONS)
+    parser.add_argument("--trees", type=int, default=N_ESTIMATORS)
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per run")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--worker", nargs=2, metavar=("MODEL", "ROWS"))
+    args = parser.parse_args()
+
+    if args.worker:
+        model_name, n_rows = args.worker
+        res = run_once(model_name, int(n_rows), args.iterations, args.trees)
+        print(json.dumps(res))
+        return
+
+    results = []
+    for n_rows in args.rows:
+        for model_name in args.models:
+            results.append(run_isolated(args, model_name, n_rows))
+            print_results(results[-1:])
+
+    current_version = version()
+    output = Path(args.output or RESULTS_DIR / f"scaling_{current_version}.json")
+    output.parent.mkdir(exist_ok=True, parents=True)
+    output.write_text(
+        json.dumps(
+            {
+                "version": current_version,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "iterations": args.iterations,
+                "trees": args.trees,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"\nResults saved at {output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
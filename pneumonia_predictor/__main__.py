@@ -0,0 +1,3 @@
+from pneumonia_predictor.cli import main
+
+main()
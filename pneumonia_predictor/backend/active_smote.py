@@ -1,11 +1,25 @@
 from collections import Counter
 
-from imblearn.over_sampling import SMOTENC
+import numpy as np
 from numpy import ndarray
-from pandas import DataFrame, concat
-from sklearn.cluster import KMeans
+from pandas import DataFrame
 
 import pneumonia_predictor.backend.logger as logger
+from pneumonia_predictor.backend.clustering import Clusterer
+from pneumonia_predictor.backend.profiler import Profiler
+from pneumonia_predictor.backend.sampling import stratified_sample_indices
+from pneumonia_predictor.backend.smote_generator import SmoteGenerator
+from pneumonia_predictor.backend.training_buffer import TrainingBuffer
+from pneumonia_predictor.backend.uncertainty import UNCERTAINTY_MEASURES, top_k_indices
+from pneumonia_predictor.config import (
+    CLUSTER_WARM_START,
+    CLUSTERING_BACKEND,
+    DIVERSITY_SAMPLE_FRAC,
+    RANDOM_STATE,
+    SMOTE_PER_CLUSTER,
+    UNCERTAINTY_MEASURE,
+    UNCERTAINTY_SAMPLE_FRAC,
+)
 
 
 class ActiveSMOTE(logger.Logger):
@@ -17,58 +31,95 @@ class ActiveSMOTE(logger.Logger):
         target_name: str,
         categ_features: list[int],
         num_clusters: int = 4,
+        random_state: int = RANDOM_STATE,
+        clustering_backend: str = CLUSTERING_BACKEND,
+        cluster_warm_start: bool = CLUSTER_WARM_START,
+        uncertainty_measure: str = UNCERTAINTY_MEASURE,
+        smote_per_cluster: bool = SMOTE_PER_CLUSTER,
     ) -> None:
         super().__init__()
+        if uncertainty_measure not in UNCERTAINTY_MEASURES:
+            self.log(
+                "err",
+                f"Unknown uncertainty measure: {uncertainty_measure}. "
+                + f"Allowed: {', '.join(UNCERTAINTY_MEASURES)}",
+            )
 
-        self.X_train = X_train.copy()
-        self.y_train = y_train.copy()
         self.target_name = target_name
         self.categ_features = categ_features
         self.probabilities = probabilities
         self.maj_class_val = y_train.value_counts().idxmax()[0]
         self.min_class_val = y_train.value_counts().idxmin()[0]
         self.num_clusters = num_clusters
+        self.uncertainty_measure = uncertainty_measure
+        self.smote_per_cluster = smote_per_cluster
+        self.random_state = random_state
+        self.rng = np.random.default_rng(random_state)
+        self.profiler = Profiler()
+
+        self.clusterer = Clusterer(
+            num_clusters, clustering_backend, cluster_warm_start, random_state
+        )
 
-        # To be used during SMOTE process
-        self.X_train_resampled = X_train.copy()
-        self.y_train_resampled = y_train.copy()
+        with self.profiler.span("ActiveSMOTE.__init__", len(X_train)):
+            # The original rows at the start of the buffer are the only copy of
+            # the training set; every subset below is an array of row indices
+            self.train_buffer = TrainingBuffer(X_train, y_train, target_name)
+            self.create_min_maj_sets()
+
+        # Neighbor search structures over the minority rows, reused every iteration
+        with self.profiler.span("SmoteGenerator.__init__", len(self.min_idx)):
+            self.smote_generator = SmoteGenerator(
+                self.train_buffer.X[self.min_idx], categ_features
+            )
+
+    @property
+    def X_train(self) -> DataFrame:
+        return DataFrame(
+            self.train_buffer.X[: self.n_train],
+            columns=self.train_buffer.columns,
+            copy=False,
+        )
+
+    @property
+    def y_train(self) -> DataFrame:
+        return DataFrame(
+            {self.target_name: self.train_buffer.y[: self.n_train]}, copy=False
+        )
 
-        self.kmeans = KMeans(n_clusters=num_clusters, random_state=42)
+    @property
+    def X_train_resampled(self) -> DataFrame:
+        return self.train_buffer.X_frame()
 
-        self.create_min_maj_sets()
+    @property
+    def y_train_resampled(self) -> DataFrame:
+        return self.train_buffer.y_frame()
 
-    def uncertainty_sampling(self, min_sample_frac: float = 0.25) -> None:
-        """This creates uncertainty set, as well as a separate set for data under
-        minority class and minority samples
+    def uncertainty_sampling(
+        self, min_sample_frac: float = UNCERTAINTY_SAMPLE_FRAC
+    ) -> None:
+        """This selects the `min_sample_frac` most uncertain minority samples,
+        ranked by `self.probabilities` of the training set
         """
         self.log("op", "Creating uncertainty set")
-        self.uncertainty_set = self.X_train.copy()
-        self.uncertainty_set[self.target_name] = self.y_train.copy()
-        self.compute_class_probability()
+        self.compute_uncertainty()
 
-        # Create minority set and samples
-        self.uncertainty_min_set = self.uncertainty_set[
-            self.uncertainty_set[self.target_name] == self.min_class_val
+        min_uncertainty = self.uncertainty[self.min_idx]
+        n_samples = round(min_sample_frac * len(min_uncertainty))
+        self.uncertainty_min_idx = self.min_idx[
+            top_k_indices(min_uncertainty, n_samples)
         ]
-        self.uncertainty_min_samples = self.uncertainty_min_set.sample(
-            frac=min_sample_frac, random_state=42
-        )
 
     def diversity_sampling(self) -> None:
-        self.create_cluster_set()
-        self.stratified_sampling()
+        with self.profiler.span("create_cluster_set", len(self.uncertainty_min_idx)):
+            self.create_cluster_set()
+        with self.profiler.span("stratified_sampling", len(self.cluster_labels)):
+            self.stratified_sampling()
 
-        self.X_diverse_min = self.diverse_min_set.drop(
-            columns=[self.target_name, "cluster"]
-        )
-        self.y_diverse_min = self.diverse_min_set[[self.target_name]]
-
-        self.X_diverse = concat(
-            [self.X_diverse_min, self.X_train_set_maj], ignore_index=True
-        )
-        self.y_diverse = concat([self.y_diverse_min, self.y_train_set_maj])
+        # Selected minority rows first, then every majority row
+        self.diverse_idx = np.concatenate([self.diverse_min_idx, self.maj_idx])
 
-    def create_synthetic_samples(self, sampling_ratio: float) -> None:
+    def create_synthetic_samples(self, sampling_ratio: float, iteration: int) -> None:
         self.log("op", "SMOTE process started")
         self.min_maj_count, self.min_maj_ratio = self.calculate_ratio()
         self.log(
@@ -78,32 +129,49 @@ class ActiveSMOTE(logger.Logger):
         )
         self.log("inf", f"SMOTE sampling ratio: {sampling_ratio}")
 
-        self.smote = SMOTENC(
-            sampling_strategy=sampling_ratio, categorical_features=self.categ_features
-        )
+        # Same count as SMOTENC(sampling_strategy=sampling_ratio) on the diverse set
+        n_samples = int(len(self.maj_idx) * sampling_ratio - len(self.diverse_min_idx))
+        if n_samples <= 0:
+            self.log(
+                "err",
+                f"SMOTE sampling ratio {sampling_ratio} leaves no samples to generate",
+            )
 
-        y_diverse_arr = self.y_diverse[self.target_name].to_numpy().astype(int)
-        self.log("op", "Running SMOTE.fit_resample")
-        self.X_smote, self.y_smote = self.smote.fit_resample(
-            self.X_diverse, y_diverse_arr
-        )
-        self.y_smote = DataFrame(self.y_smote, columns=[self.target_name])
+        self.log("op", f"Generating {n_samples} synthetic samples")
+        rows = np.searchsorted(self.min_idx, self.diverse_min_idx)
+        with self.profiler.span("SMOTE.generate", n_samples):
+            if self.smote_per_cluster:
+                X_new, self.synthetic_clusters = (
+                    self.smote_generator.generate_per_cluster(
+                        rows, self.diverse_min_clusters, n_samples, self.rng
+                    )
+                )
+            else:
+                X_new = self.smote_generator.generate(rows, n_samples, self.rng)
 
         self.log("op", "Creating sets: X_synthetic, y_synthetic")
-        self.X_synthetic = self.X_smote.iloc[len(self.X_diverse) :]
-        self.y_synthetic = self.y_smote.iloc[len(self.y_diverse) :]
-
-        self.log("op", "Creating sets: synthetic_samples")
-        self.current_synthetic_samples = concat(
-            [self.X_synthetic, self.y_synthetic], axis=1
+        self.X_synthetic = DataFrame(
+            X_new, columns=self.train_buffer.columns, copy=False
+        )
+        self.y_synthetic = DataFrame(
+            {self.target_name: np.full(n_samples, self.min_class_val)}
         )
 
-        self.log("op", "Applying synthetic_samples to: X_train, y_train")
-        self.X_train_resampled = concat(
-            [self.X_train_resampled, self.X_synthetic], ignore_index=True
+        if not self.smote_per_cluster:
+            # Source cluster: the nearest centroid of this iteration's clustering
+            self.synthetic_clusters = self.clusterer.predict(
+                self.X_synthetic.to_numpy()
+            )
+
+        self.log("op", "Applying synthetic_samples to: train_buffer")
+        self.profiler.check_budget(
+            "train_buffer.append",
+            self.train_buffer.growth_bytes(
+                len(self.train_buffer) + len(self.X_synthetic)
+            ),
         )
-        self.y_train_resampled = concat(
-            [self.y_train_resampled, self.y_synthetic], ignore_index=True
+        self.train_buffer.append(
+            self.X_synthetic, self.y_synthetic[self.target_name], iteration
         )
 
         # Recalculate
@@ -116,66 +184,39 @@ class ActiveSMOTE(logger.Logger):
         self.log("op", "SMOTE process done")
 
     def create_min_maj_sets(self) -> None:
-        self.train_set = concat([self.X_train, self.y_train], axis=1)
-
-        self.log(
-            "op", "Creating set: train_set_min/maj, y_train_min/maj, X_train_min/maj"
+        self.log("op", "Creating index sets: min_idx, maj_idx")
+        self.n_train = self.train_buffer.n_original
+        y = self.train_buffer.y[: self.n_train]
+        self.min_idx = np.flatnonzero(y == self.min_class_val)
+        self.maj_idx = np.flatnonzero(y == self.maj_class_val)
+
+    def compute_uncertainty(self) -> None:
+        self.log("op", f"Computing uncertainty: {self.uncertainty_measure}")
+        self.uncertainty = UNCERTAINTY_MEASURES[self.uncertainty_measure](
+            np.asarray(self.probabilities)
         )
 
-        self.train_set_maj = self.train_set[
-            self.train_set[self.target_name] == self.maj_class_val
-        ]
-        self.train_set_min = self.train_set[
-            self.train_set[self.target_name] == self.min_class_val
-        ]
-        self.y_train_set_min = self.train_set_min[
-            self.train_set_min[self.target_name] == self.min_class_val
-        ][[self.target_name]]
-        self.y_train_set_maj = self.train_set_maj[
-            self.train_set_maj[self.target_name] == self.maj_class_val
-        ][[self.target_name]]
-        self.X_train_set_maj = self.train_set_maj.drop(columns=[self.target_name])
-        self.X_train_set_min = self.train_set_min.drop(columns=[self.target_name])
-
-    def compute_class_probability(self) -> None:
-        # There are other ways of calculating class probability
-        self.log("op", "Computing 'class_probability'")
-        self.uncertainty_set["class_probability"] = 1 * self.probabilities.max(axis=1)
-        self.uncertainty_set.sort_values(by="class_probability", ascending=False)
-
     def create_cluster_set(self) -> None:
-        uncertainty_min_samples = self.uncertainty_min_samples.drop(
-            columns=["class_probability"]
-        ).copy()
-        self.kmeans.fit(uncertainty_min_samples)
-        self.log("op", "Creating clustered_set")
-        self.cluster_labels = self.kmeans.labels_
-        self.clustered_set = uncertainty_min_samples.copy()
-        self.clustered_set["cluster"] = self.cluster_labels
-
-    def stratified_sampling(self) -> None:
-        self.log("op", "Creating diverse_min_set")
-        self.diverse_min_set = DataFrame()
-        for n_cluster in range(self.num_clusters):
-            target_n_samples = int(
-                0.20
-                * len(self.clustered_set[self.clustered_set["cluster"] == n_cluster])
-            )
-            sampled_data = self.clustered_set[
-                self.clustered_set["cluster"] == n_cluster
-            ].sample(n=target_n_samples, replace=False)
-            self.log(
-                "op",
-                f"Adding sample to diverse_min_set from cluster {n_cluster}: "
-                + f"target num samples: {target_n_samples}",
-            )
-            self.diverse_min_set = concat(
-                [self.diverse_min_set, sampled_data], ignore_index=True
-            )
+        self.log("op", "Clustering the uncertain minority samples")
+        self.cluster_labels = self.clusterer.fit(
+            self.train_buffer.X.take(self.uncertainty_min_idx, axis=0)
+        )
+
+    def stratified_sampling(self, sample_frac: float = DIVERSITY_SAMPLE_FRAC) -> None:
+        self.log("op", "Creating diverse_min_idx")
+        positions = stratified_sample_indices(
+            self.cluster_labels, sample_frac, self.rng
+        )
+        self.log(
+            "op",
+            "Target num samples per cluster for diverse_min_idx: "
+            + f"{np.bincount(self.cluster_labels[positions]).tolist()}",
+        )
+        self.diverse_min_idx = self.uncertainty_min_idx[positions]
+        self.diverse_min_clusters = self.cluster_labels[positions]
 
     def calculate_ratio(self) -> tuple[dict, float]:
-        div_count = Counter(self.y_diverse[self.target_name].to_numpy())
-        min_maj_count = Counter(self.y_train_resampled[self.target_name].to_numpy())
-        ratio = div_count[self.min_class_val] / div_count[self.maj_class_val] + 0.001
+        min_maj_count = Counter(self.train_buffer.y)
+        ratio = len(self.diverse_min_idx) / len(self.maj_idx) + 0.001
 
         return min_maj_count, ratio
@@ -0,0 +1,161 @@
+import os
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pandas import DataFrame
+
+from pneumonia_predictor.backend.compiled_forest import CompiledForest
+from pneumonia_predictor.backend.data_fetcher import SUPPORTED_DS_TYPES, iter_data
+from pneumonia_predictor.backend.data_transformer import DataTransformer
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    FEATURE_COLUMNS,
+    SAVED_MODELS,
+    SAVED_MODELS_PATH,
+    SCORING_CHUNK_SIZE,
+)
+
+
+class BatchScorer(Logger):
+    """Scores CSV/Parquet datasets chunk by chunk with a saved model, appending
+    every scored chunk to the output file before reading the next one.
+
+    Parquet and Feather files are written with the column types of the first
+    chunk. When a later chunk needs wider types (e.g. floats in an integer
+    column, or values in a column that was all null), the chunks written so
+    far are rewritten with the promoted types.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        chunk_size: int = SCORING_CHUNK_SIZE,
+        models_location: str = SAVED_MODELS_PATH,
+    ) -> None:
+        super().__init__()
+        self.model_name = SAVED_MODELS.get(model_name, model_name)
+        self.chunk_size = chunk_size
+        self.model = CompiledForest.from_saved(self.model_name, models_location)
+        self.transformer = DataTransformer()
+
+    def score(self, input_path: str, output_path: str) -> None:
+        input_path, output_path = Path(input_path), Path(output_path)
+        input_type = input_path.suffix.lstrip(".")
+        self.output_type = output_path.suffix.lstrip(".")
+        if self.output_type not in SUPPORTED_DS_TYPES:
+            self.log("err", f"File type not supported: {self.output_type}")
+
+        self.log("sep", "=")
+        self.log("op", f"Scoring ./{input_path} with {self.model_name}")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.unlink(missing_ok=True)
+        self.arrow_writer = None
+
+        self.n_rows = 0
+        start = time.perf_counter()
+        chunks = iter_data(
+            input_path.stem, input_type, str(input_path.parent), self.chunk_size
+        )
+        for chunk in chunks:
+            self.write_chunk(self.score_chunk(chunk), output_path)
+            self.n_rows += len(chunk)
+            self.log("inf", f"Scored rows: {self.n_rows}")
+
+        if self.arrow_writer is not None:
+            self.arrow_writer.close()
+        self.elapsed = time.perf_counter() - start
+        self.rows_per_sec = self.n_rows / self.elapsed if self.elapsed else 0.0
+        self.log(
+            "inf",
+            f"Scored {self.n_rows} rows in {self.elapsed:.2f}s "
+            + f"({self.rows_per_sec:.0f} rows/sec) -> ./{output_path}",
+        )
+
+    def score_chunk(self, chunk: DataFrame) -> DataFrame:
+        # Features are checked and scored in their compact dtypes, but the rows
+        # are written out as they were read
+        features = self.transformer.apply_schema(chunk[FEATURE_COLUMNS])
+        predictions, probabilities = self.model.predict_with_proba(features)
+        scores = {"prediction": predictions}
+        for i, class_val in enumerate(self.model.classes_):
+            scores[f"probability_{class_val}"] = probabilities[:, i]
+        return chunk.assign(**scores)
+
+    def write_chunk(self, scored: DataFrame, output_path: Path) -> None:
+        if self.output_type == "csv":
+            scored.to_csv(
+                output_path, mode="a", header=not output_path.is_file(), index=False
+            )
+            return
+
+        table = pa.Table.from_pandas(scored, preserve_index=False)
+        if self.arrow_writer is None:
+            self.null_columns = set(table.column_names)
+            self.open_writer(output_path, table.schema)
+        elif not table.schema.equals(self.output_schema):
+            # Passthrough columns can change type between chunks (e.g. all-null
+            # then strings, or integers then floats with NaN)
+            self.promote(output_path, self.unified_schema(table.schema))
+        self.null_columns -= {
+            name for name in self.null_columns if table[name].null_count < len(table)
+        }
+        self.arrow_writer.write_table(table.cast(self.output_schema))
+
+    def unified_schema(self, schema: pa.Schema) -> pa.Schema:
+        """The output schema promoted to fit the chunk with `schema`. Columns
+        that were all null so far take the type of the chunk
+        """
+        written = pa.schema(
+            [
+                field.with_type(pa.null()) if field.name in self.null_columns else field
+                for field in self.output_schema
+            ]
+        )
+        try:
+            unified = pa.unify_schemas([written, schema], promote_options="permissive")
+        except pa.ArrowTypeError as e:
+            self.log("err", f"Column types changed at row {self.n_rows}: {e}")
+        # Columns still all null keep their type
+        return pa.schema(
+            [
+                self.output_schema.field(field.name)
+                if pa.types.is_null(field.type)
+                else field
+                for field in unified
+            ],
+            metadata=schema.metadata,
+        )
+
+    def open_writer(self, output_path: Path, schema: pa.Schema) -> None:
+        self.output_schema = schema
+        self.arrow_writer = (
+            pa.ipc.new_file(output_path, schema)
+            if self.output_type == "feather"
+            else pq.ParquetWriter(output_path, schema)
+        )
+
+    def promote(self, output_path: Path, schema: pa.Schema) -> None:
+        """Rewrites the chunks written so far with `schema`, if it differs from
+        the one they were written with
+        """
+        if schema.equals(self.output_schema):
+            return
+        self.log("op", f"Promoting output column types at row {self.n_rows}")
+        self.arrow_writer.close()
+        written = output_path.with_name(f".{output_path.name}.{uuid4().hex}.tmp")
+        os.replace(output_path, written)
+        try:
+            self.open_writer(output_path, schema)
+            for batch in ds.dataset(written, format=self.output_type).to_batches():
+                self.arrow_writer.write_table(
+                    pa.Table.from_batches([batch]).cast(schema)
+                )
+        finally:
+            written.unlink(missing_ok=True)
+
+    def __str__(self) -> str:
+        return f"Batch Scorer ({self.model_name})"
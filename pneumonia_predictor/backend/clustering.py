@@ -0,0 +1,65 @@
+import numpy as np
+from pandas import DataFrame
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    CLUSTER_WARM_START,
+    CLUSTERING_BACKEND,
+    MINIBATCH_SIZE,
+    RANDOM_STATE,
+)
+
+CLUSTERING_BACKENDS = {"kmeans", "minibatch"}
+
+
+class Clusterer(Logger):
+    """k-means clustering for Active SMOTE's diversity sampling.
+
+    `backend` is either full-batch `kmeans` or `minibatch` (`MiniBatchKMeans`).
+    With `warm_start`, every fit after the first one starts from the previous
+    fit's centroids with a single initialization instead of `n_init` fresh ones.
+    """
+
+    def __init__(
+        self,
+        num_clusters: int,
+        backend: str = CLUSTERING_BACKEND,
+        warm_start: bool = CLUSTER_WARM_START,
+        random_state: int = RANDOM_STATE,
+        batch_size: int = MINIBATCH_SIZE,
+    ) -> None:
+        super().__init__()
+        if backend not in CLUSTERING_BACKENDS:
+            self.log(
+                "err",
+                f"Unknown clustering backend: {backend}. Allowed: kmeans, minibatch",
+            )
+        self.num_clusters = num_clusters
+        self.backend = backend
+        self.warm_start = warm_start
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.cluster_centers_ = None
+
+    def fit(self, X: DataFrame | np.ndarray) -> np.ndarray:
+        warm = self.warm_start and self.cluster_centers_ is not None
+        params = {
+            "n_clusters": self.num_clusters,
+            "init": self.cluster_centers_ if warm else "k-means++",
+            "n_init": 1 if warm else "auto",
+            "random_state": self.random_state,
+        }
+
+        self.log("op", f"Fitting {self.backend} clustering (warm start: {warm})")
+        if self.backend == "minibatch":
+            self.model = MiniBatchKMeans(batch_size=self.batch_size, **params)
+        else:
+            self.model = KMeans(**params)
+        self.model.fit(X)
+        self.cluster_centers_ = self.model.cluster_centers_
+        self.labels_ = self.model.labels_
+        return self.labels_
+
+    def predict(self, X: DataFrame | np.ndarray) -> np.ndarray:
+        return self.model.predict(X)
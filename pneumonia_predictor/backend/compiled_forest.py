@@ -0,0 +1,139 @@
+import joblib
+import numpy as np
+from pandas import DataFrame
+from sklearn.ensemble import RandomForestClassifier
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import INFERENCE_VECTORIZED_ROWS, SAVED_MODELS_PATH
+
+
+class CompiledForest(Logger):
+    """Flattens a fitted `RandomForestClassifier` into packed node arrays and
+    evaluates every tree for every row in one vectorized traversal.
+
+    Batches larger than `vectorized_rows` are routed through each tree's compiled
+    `apply` instead, which wins once per-call overhead is no longer dominant.
+    Either way, probabilities are accumulated tree by tree in the same order as
+    sklearn, so `predict_proba` matches `RandomForestClassifier.predict_proba`
+    bit-for-bit.
+    """
+
+    def __init__(
+        self,
+        classifier: RandomForestClassifier,
+        vectorized_rows: int = INFERENCE_VECTORIZED_ROWS,
+    ) -> None:
+        super().__init__()
+
+        self.classes_ = classifier.classes_
+        self.n_classes = len(classifier.classes_)
+        self.n_features = classifier.n_features_in_
+        self.feature_names = getattr(classifier, "feature_names_in_", None)
+        self.n_trees = len(classifier.estimators_)
+        self.vectorized_rows = vectorized_rows
+        self.trees = [estimator.tree_ for estimator in classifier.estimators_]
+
+        self.compile(classifier)
+
+    @classmethod
+    def from_saved(
+        cls, model_name: str, location: str = SAVED_MODELS_PATH
+    ) -> "CompiledForest":
+        return cls(joblib.load(f"{location}/{model_name}.pkl"))
+
+    def compile(self, classifier: RandomForestClassifier) -> None:
+        self.log("op", f"Compiling forest of {self.n_trees} trees into node arrays")
+        node_counts = np.array([tree.node_count for tree in self.trees])
+        offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+
+        features, thresholds, lefts, rights, missing_left, values = (
+            [] for _ in range(6)
+        )
+        for tree, offset in zip(self.trees, offsets):
+            node_ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves so finished paths stay put
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            missing_left.append(
+                getattr(tree, "missing_go_to_left", np.zeros(tree.node_count)) != 0
+            )
+            values.append(tree.value[:, 0, : self.n_classes])
+
+        self.roots = offsets.astype(np.int32)
+        self.feature = np.concatenate(features).astype(np.int32)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        # children[2 * node + 1] is the left child, children[2 * node] the right one
+        self.children = np.stack(
+            [np.concatenate(rights), np.concatenate(lefts)], axis=1
+        ).astype(np.int32)
+        self.is_leaf = self.children[:, 0] == np.arange(len(self.children))
+        self.children = self.children.ravel()
+        self.missing_go_to_left = np.concatenate(missing_left) | self.is_leaf
+        self.leaf_proba = np.ascontiguousarray(np.concatenate(values), np.float64)
+
+    def predict_proba(self, X: DataFrame | np.ndarray) -> np.ndarray:
+        X = self.validate_input(X)
+        if len(X) > self.vectorized_rows:
+            leaves = (
+                tree.apply(X) + root for tree, root in zip(self.trees, self.roots)
+            )
+        else:
+            leaves = self.traverse(X).reshape(self.n_trees, len(X))
+
+        proba = np.zeros((len(X), self.n_classes), dtype=np.float64)
+        for tree_leaves in leaves:
+            proba += self.leaf_proba.take(tree_leaves, axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X: DataFrame | np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def predict_with_proba(
+        self, X: DataFrame | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1)), proba
+
+    def validate_input(self, X: DataFrame | np.ndarray) -> np.ndarray:
+        if isinstance(X, DataFrame):
+            if self.feature_names is not None:
+                X = X[self.feature_names]
+            # Nullable (schema) columns hold pd.NA, which only to_numpy converts
+            X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+        # Trees are fitted on float32, so thresholds are compared in float32 too
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            self.log(
+                "err",
+                f"Expected input with {self.n_features} features, got {X.shape}",
+            )
+        return X
+
+    def traverse(self, X: np.ndarray) -> np.ndarray:
+        n_rows = len(X)
+        X_flat = X.ravel()
+        node = np.repeat(self.roots, n_rows)  # tree-major: (n_trees * n_rows)
+        row_start = np.tile(np.arange(n_rows, dtype=np.int32), self.n_trees)
+        row_start *= self.n_features
+        check_nan = np.isnan(X_flat).any()
+
+        # Only paths that have not reached a leaf are advanced on each level
+        active = np.flatnonzero(~self.is_leaf[node])
+        while active.size:
+            curr = node.take(active)
+            x = X_flat.take(row_start.take(active) + self.feature.take(curr))
+            go_left = x <= self.threshold.take(curr)
+            if check_nan:
+                go_left |= np.isnan(x) & self.missing_go_to_left.take(curr)
+            next_node = self.children.take(2 * curr + go_left)
+            node[active] = next_node
+            active = active.compress(~self.is_leaf.take(next_node))
+        return node
+
+    def __str__(self) -> str:
+        return f"Compiled Random Forest ({self.n_trees} trees)"
@@ -1,47 +1,279 @@
-import urllib.request
+from collections.abc import Iterator
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Any
 
+import numpy as np
 import pandas as pd
 import patoolib
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
+from pneumonia_predictor.backend.data_transformer import DataTransformer
+from pneumonia_predictor.backend.download_manager import DownloadManager
 from pneumonia_predictor.backend.logger import Logger
-from pneumonia_predictor.config import DATASET_DIR
+from pneumonia_predictor.config import DATASET_DIR, SCORING_CHUNK_SIZE
 
-SUPPORTED_DS_TYPES = {"csv", "parquet"}
+SUPPORTED_DS_TYPES = {"csv", "parquet", "feather"}
 LOGGER = Logger()
+TRANSFORMER = DataTransformer()
 
+# (column, op, value) conditions that must all hold, or a list of such lists
+Filters = list[tuple[str, str, Any]] | list[list[tuple[str, str, Any]]]
 
-def download_data(url: str, filename: str, location: str = DATASET_DIR) -> None:
-    download_path = f"{location}/{filename}"
 
+def download_data(
+    url: str, filename: str, location: str = DATASET_DIR, sha256: str | None = None
+) -> Future | None:
+    """Downloads `url` to `location/filename` through the download cache (see
+    `DownloadManager`), verified against `sha256` when given.
+
+    Archives are extracted into `location` in the background; the returned
+    future completes once the extraction has (None if there is nothing to
+    extract, or the file was already in place).
+    """
+    download_path = Path(location) / filename
     LOGGER.log("op", f"Preparing to download: {url}")
-    if not Path(download_path).is_file():
-        LOGGER.log("op", f"Downloading dataset from: {url}")
-        urllib.request.urlretrieve(url, Path(download_path))
-        if patoolib.is_archive(Path(download_path)):
-            LOGGER.log("op", f"Extracting archive: ./{download_path}")
-            patoolib.extract_archive(
-                archive=Path(download_path), verbosity=1, outdir=location
-            )
-    else:
+
+    manager = DownloadManager()
+    if not manager.materialize(manager.fetch(url, sha256), download_path):
         LOGGER.log(
             "inf", f"File already exists: ./{download_path}. Downloading skipped"
         )
+        return None
+    if patoolib.is_archive(download_path):
+        return manager.extract_in_background(download_path, Path(location))
+    return None
 
 
 def load_data(
-    dataset_name: str, dataset_type: str = "csv", location: str = DATASET_DIR
+    dataset_name: str,
+    dataset_type: str = "csv",
+    location: str = DATASET_DIR,
+    columns: list[str] | None = None,
+    filters: Filters | None = None,
+    dtypes: dict[str, str] | None = None,
 ) -> pd.DataFrame:
+    """Loads a dataset, optionally only its `columns` and the rows matching
+    `filters`, with the `dtypes` given (e.g. `config.FEATURE_SCHEMA`) instead of
+    inferred ones. As in `DataTransformer.apply_schema`, integer columns with
+    missing values get the nullable dtype of the same width.
+
+    `filters` use the pyarrow format: a list of `(column, op, value)` tuples
+    that must all hold, or a list of such lists of which any may hold, with op
+    one of `==`, `!=`, `<`, `<=`, `>`, `>=`, `in` and `not in`. Parquet files
+    skip the row groups that cannot match; CSV files are read and filtered in
+    chunks of `SCORING_CHUNK_SIZE` rows so the unfiltered file is never held
+    in memory.
+
+    Parquet datasets may be partitioned directories (see `DataTransformer.save`),
+    whose partition columns come after the other columns unless `columns`
+    orders them. Feather (Arrow IPC) files are memory-mapped, so columns used
+    in place are read-only.
+    """
+    full_path = find_dataset(dataset_name, dataset_type, location)
+    LOGGER.log("inf", f"Dataset found: ./{full_path}. Loaded.")
+    if filters and dataset_type == "csv":
+        return pd.concat(
+            read_chunks(
+                Path(full_path),
+                dataset_type,
+                SCORING_CHUNK_SIZE,
+                columns,
+                filters,
+                dtypes,
+            ),
+            ignore_index=True,
+        )
+
+    dataset_readers = {
+        "csv": lambda csv: read_csv(csv, columns, dtypes),
+        "parquet": lambda parquet: cast(
+            read_parquet(parquet, columns, filters), dtypes
+        ),
+        "feather": lambda ipc: cast(read_feather(ipc, columns, filters), dtypes),
+    }
+    return dataset_readers[dataset_type](Path(full_path))
+
+
+def iter_data(
+    dataset_name: str,
+    dataset_type: str = "csv",
+    location: str = DATASET_DIR,
+    chunk_size: int = SCORING_CHUNK_SIZE,
+    columns: list[str] | None = None,
+    filters: Filters | None = None,
+    dtypes: dict[str, str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Same as `load_data`, but yields the dataset in chunks of at most
+    `chunk_size` rows so only one chunk is held in memory at a time. Chunks
+    left empty by `filters` are skipped.
+    """
+    full_path = find_dataset(dataset_name, dataset_type, location)
+    LOGGER.log("inf", f"Dataset found: ./{full_path}. Streaming {chunk_size} rows")
+    for chunk in read_chunks(
+        Path(full_path), dataset_type, chunk_size, columns, filters, dtypes
+    ):
+        if len(chunk):
+            yield chunk
+
+
+def read_chunks(
+    path: Path,
+    dataset_type: str,
+    chunk_size: int,
+    columns: list[str] | None,
+    filters: Filters | None,
+    dtypes: dict[str, str] | None,
+) -> Iterator[pd.DataFrame]:
+    # CSV columns that are only read to evaluate the filters
+    filter_columns = {col for col, _, _ in iter_filters(filters)}
+    usecols = None if columns is None else [*columns, *filter_columns - {*columns}]
+
     dataset_readers = {
-        "csv": lambda csv: pd.read_csv(csv),
-        "parquet": lambda parquet: pd.read_parquet(parquet, engine="pyarrow"),
+        "csv": lambda csv: (
+            cast(apply_filters(chunk, filters)[columns or chunk.columns], dtypes)
+            for chunk in pd.read_csv(
+                csv, chunksize=chunk_size, usecols=usecols, dtype=csv_dtypes(dtypes)
+            )
+        ),
+        "parquet": lambda parquet: (
+            cast(batch.to_pandas(), dtypes)
+            for batch in ds.dataset(
+                parquet, format="parquet", partitioning="hive"
+            ).to_batches(
+                columns=columns,
+                filter=pq.filters_to_expression(filters) if filters else None,
+                batch_size=chunk_size,
+            )
+        ),
+        "feather": lambda ipc: (
+            cast(batch.to_pandas(), dtypes)
+            for batch in ds.dataset(ipc, format="feather").to_batches(
+                columns=columns,
+                filter=pq.filters_to_expression(filters) if filters else None,
+                batch_size=chunk_size,
+            )
+        ),
     }
+    return dataset_readers[dataset_type](path)
+
+
+def read_csv(
+    path: Path, columns: list[str] | None, dtypes: dict[str, str] | None
+) -> pd.DataFrame:
+    dataset = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(dtypes))
+    # usecols keeps the column order of the file
+    return cast(dataset if columns is None else dataset[columns], dtypes)
+
 
+def read_parquet(
+    path: Path, columns: list[str] | None, filters: Filters | None
+) -> pd.DataFrame:
+    """Reads a Parquet file or partitioned directory the way `iter_data` does,
+    so partition columns get the same dtype
+    """
+    return (
+        ds.dataset(path, format="parquet", partitioning="hive")
+        .to_table(
+            columns=columns,
+            filter=pq.filters_to_expression(filters) if filters else None,
+        )
+        .to_pandas()
+    )
+
+
+def read_feather(
+    path: Path, columns: list[str] | None, filters: Filters | None
+) -> pd.DataFrame:
+    """Memory-maps an Arrow IPC file. Numeric columns of an uncompressed file
+    written as one record batch are used in place instead of being copied
+    """
+    if filters:
+        table = ds.dataset(path, format="feather").to_table(
+            columns=columns, filter=pq.filters_to_expression(filters)
+        )
+    else:
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    # One block per column, so pandas does not copy them into 2D blocks
+    return table.to_pandas(split_blocks=True)
+
+
+def cast(dataset: pd.DataFrame, dtypes: dict[str, str] | None) -> pd.DataFrame:
+    if not dtypes:
+        return dataset
+    return dataset.astype(
+        {
+            col: TRANSFORMER.schema_dtype(dataset[col], dtype)
+            for col, dtype in dtypes.items()
+            if col in dataset.columns
+        }
+    )
+
+
+def csv_dtypes(dtypes: dict[str, str] | None) -> dict[str, str] | None:
+    """The `dtypes` the CSV parser can read directly: integer columns may have
+    missing values, so they are parsed as inferred and then `cast`
+    """
+    if not dtypes:
+        return None
+    return {
+        col: dtype
+        for col, dtype in dtypes.items()
+        if pd.api.types.pandas_dtype(dtype).kind not in "iu"
+    }
+
+
+def iter_filters(filters: Filters | None) -> Iterator[tuple[str, str, Any]]:
+    if not filters:
+        return
+    for group in filters if isinstance(filters[0], list) else [filters]:
+        yield from group
+
+
+def apply_filters(dataset: pd.DataFrame, filters: Filters | None) -> pd.DataFrame:
+    """The rows of `dataset` matching `filters` (see `load_data`). As with pyarrow,
+    comparisons never match missing values, while `in` and `not in` treat
+    them as one more value
+    """
+    if not filters:
+        return dataset
+
+    ops = {
+        "==": lambda col, value: col == value,
+        "=": lambda col, value: col == value,
+        "!=": lambda col, value: col != value,
+        "<": lambda col, value: col < value,
+        "<=": lambda col, value: col <= value,
+        ">": lambda col, value: col > value,
+        ">=": lambda col, value: col >= value,
+        "in": lambda col, value: col.isin(value),
+        "not in": lambda col, value: ~col.isin(value),
+    }
+    groups = filters if isinstance(filters[0], list) else [filters]
+    mask = np.zeros(len(dataset), dtype=bool)
+    for group in groups:
+        group_mask = np.ones(len(dataset), dtype=bool)
+        for col, op, value in group:
+            if op not in ops:
+                LOGGER.log("err", f"Unsupported filter operator: {op}")
+            matches = ops[op](dataset[col], value)
+            if op not in {"in", "not in"}:
+                # As in pyarrow, a comparison with a missing value never holds
+                matches &= dataset[col].notna()
+            group_mask &= matches.to_numpy(dtype=bool)
+        mask |= group_mask
+    return dataset[mask]
+
+
+def find_dataset(dataset_name: str, dataset_type: str, location: str) -> str:
     full_path = f"{location}/{dataset_name}.{dataset_type}"
-    if not Path(full_path).is_file():
+    # Partitioned Parquet datasets are directories
+    if not Path(full_path).exists():
         LOGGER.log("err", f"Dataset not found: ./{full_path}")
     if dataset_type not in SUPPORTED_DS_TYPES:
         LOGGER.log("err", f"File type not supported: {dataset_type}")
-
-    LOGGER.log("inf", f"Dataset found: ./{full_path}. Loaded.")
-    return dataset_readers[dataset_type](Path(full_path))
+    return full_path
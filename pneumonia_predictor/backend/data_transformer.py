@@ -1,10 +1,23 @@
+import os
 from pathlib import Path
 from typing import Any, Callable
+from uuid import uuid4
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 
 from pneumonia_predictor.backend.logger import Logger
-from pneumonia_predictor.config import DATASET_DIR
+from pneumonia_predictor.config import (
+    DATASET_COMPRESSION,
+    DATASET_DIR,
+    FEATURE_SCHEMA,
+    PARQUET_ROW_GROUP_SIZE,
+)
+
+TYPE_OPTS = {"str": str, "int": int, "float": float}
 
 
 class DataTransformer(Logger):
@@ -36,34 +49,284 @@ class DataTransformer(Logger):
     def change_col_type(
         self, dataset: pd.DataFrame, columns: list[str], to_type: str
     ) -> pd.DataFrame:
-        type_opts = {"str": str, "int": int, "float": float}
-
         new_dataset = dataset.copy()
         for col in columns:
             self.log("op", f"Changing datatype of column {col} -> {to_type}")
-            new_dataset[col] = new_dataset[col].astype(type_opts[to_type])
+            new_dataset[col] = new_dataset[col].astype(TYPE_OPTS[to_type])
         return new_dataset
 
+    def apply_schema(
+        self, dataset: pd.DataFrame, schema: dict[str, str] = FEATURE_SCHEMA
+    ) -> pd.DataFrame:
+        """Casts the columns of `dataset` found in `schema` in a single pass.
+
+        Integer columns with missing values get the nullable pandas dtype of the
+        same width (e.g. `uint8` -> `UInt8`), and values that are not whole
+        numbers or do not fit their integer dtype are an error instead of being
+        silently truncated or wrapped around.
+        """
+        dtypes = {
+            col: self.schema_dtype(dataset[col], dtype)
+            for col, dtype in schema.items()
+            if col in dataset.columns
+        }
+
+        before = dataset.memory_usage(deep=True).sum()
+        new_dataset = dataset.astype(dtypes)
+        after = new_dataset.memory_usage(deep=True).sum()
+        self.log(
+            "op",
+            f"Applied schema to {len(dtypes)} columns: "
+            + f"{before / 1024**2:.1f} MB -> {after / 1024**2:.1f} MB",
+        )
+        return new_dataset
+
+    def schema_dtype(self, values: pd.Series, dtype: str) -> np.dtype | str:
+        """The dtype `values` are cast to for `dtype` in a schema"""
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "iu":
+            return dtype
+        present = values.dropna()
+        if not (present % 1 == 0).all():
+            fractional = present[present % 1 != 0]
+            self.log(
+                "err",
+                f"Column '{values.name}' has non-integer values for {dtype}: "
+                + f"{fractional.iloc[0]} ({len(fractional)} rows)",
+            )
+        bounds = np.iinfo(dtype)
+        if values.min() < bounds.min or values.max() > bounds.max:
+            self.log(
+                "err",
+                f"Column '{values.name}' has values outside the range of {dtype}: "
+                + f"[{values.min()}, {values.max()}]",
+            )
+        if values.isna().any():
+            return dtype.name.capitalize().replace("Ui", "UI")
+        return dtype
+
+    def pipeline(self, dataset: pd.DataFrame) -> "TransformPlan":
+        """Lazy version of the methods above: see `TransformPlan`"""
+        return TransformPlan(self, dataset)
+
     def save(
         self,
         dataset: pd.DataFrame,
         filename: str,
         location: str = DATASET_DIR,
         filetype: str = "csv",
+        partition_cols: list[str] | None = None,
+        compression: str | None = DATASET_COMPRESSION,
+        row_group_size: int | None = PARQUET_ROW_GROUP_SIZE,
     ) -> None:
+        """Saves `dataset` as `csv`, `parquet` or `feather` (Arrow IPC).
+
+        With `partition_cols`, a Parquet dataset is written as a directory with
+        one subdirectory per value of the columns (e.g. `admission_month=3/`),
+        replacing the partitions it writes to. `compression` is a Parquet or
+        Arrow codec (`snappy`, `zstd`, `lz4`, ...). `row_group_size` is the
+        number of rows per Parquet row group or Feather record batch.
+
+        By default, Feather files are written uncompressed as a single record
+        batch: `load_data` then memory-maps them and uses the numeric columns
+        in place, without copying them. Files are written to a temporary file
+        and renamed into place, so saving over a file that is still mapped is
+        safe.
+        """
         full_path = f"{location}/{filename}.{filetype}"
         self.log(
             "op",
             f"Saving dataframe as {filetype}: ./{full_path}",
         )
+        if filetype == "csv" and (partition_cols or compression or row_group_size):
+            self.log(
+                "err",
+                "Partitioning, compression and row groups need parquet or feather",
+            )
+        if filetype == "feather" and partition_cols:
+            self.log("err", "Partitioned datasets need parquet")
 
         Path(location).mkdir(parents=True, exist_ok=True)
 
+        parquet_opts = {"row_group_size": row_group_size}
+        if compression is not None:
+            parquet_opts["compression"] = compression
         type_opts = {
             "csv": lambda df, path: df.to_csv(path, index=False),
             "parquet": lambda df, path: df.to_parquet(
-                path, engine="pyarrow", index=False
+                path, engine="pyarrow", index=False, **parquet_opts
+            ),
+            "feather": lambda df, path: feather.write_feather(
+                df.reset_index(drop=True),
+                path,
+                compression=compression or "uncompressed",
+                chunksize=row_group_size or max(len(df), 1),
             ),
         }
 
-        type_opts[filetype](dataset, Path(full_path))
+        if partition_cols:
+            pq.write_to_dataset(
+                pa.Table.from_pandas(dataset, preserve_index=False),
+                full_path,
+                partition_cols=partition_cols,
+                existing_data_behavior="delete_matching",
+                **parquet_opts,
+            )
+        else:
+            # Written next to the destination and renamed over it: frames loaded
+            # from a memory-mapped Feather file keep mapping the old file
+            path = Path(full_path)
+            tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+            try:
+                type_opts[filetype](dataset, tmp)
+                os.replace(tmp, path)
+            finally:
+                tmp.unlink(missing_ok=True)
+
+
+class TransformPlan(Logger):
+    """`DataTransformer` operations recorded on `dataset` and run in one pass by
+    `execute`, instead of one full copy of the dataset per operation.
+
+    Every method returns the plan, so calls can be chained:
+
+        dataset = (
+            transformer.pipeline(raw)
+            .remove_columns(["id"])
+            .map_col_values({"sex": {"Male": 1, "Female": 0}})
+            .change_col_type(["sex"], "int")
+            .execute()
+        )
+
+    On `execute`, removed columns are dropped along with the operations
+    recorded on them, consecutive mappings of a column are merged into one
+    mapping and consecutive casts to the same type into one cast. Every other
+    column is built by running its operations back to back, and the
+    untouched ones are only copied into the result.
+
+    Transforms marked `vectorized` (and NumPy ufuncs) are called once with the
+    whole column. Other functions are called once per distinct value of the
+    column instead of once per row, so they must be pure.
+    """
+
+    def __init__(self, transformer: DataTransformer, dataset: pd.DataFrame) -> None:
+        super().__init__()
+        self.transformer = transformer
+        self.dataset = dataset
+        self.steps = []  # (column or None for removals, operation, argument)
+
+    def remove_columns(self, columns: list[str]) -> "TransformPlan":
+        self.steps.append((None, "remove", list(columns)))
+        return self
+
+    def transform_columns(
+        self, columns: dict[str, Callable[..., Any]], vectorized: bool = False
+    ) -> "TransformPlan":
+        for col, func in columns.items():
+            op = "vectorized" if vectorized or isinstance(func, np.ufunc) else "apply"
+            self.steps.append((col, op, func))
+        return self
+
+    def map_col_values(
+        self, columns_w_mapper: dict[str, dict[str, int]]
+    ) -> "TransformPlan":
+        for col, mapper in columns_w_mapper.items():
+            self.steps.append((col, "map", mapper))
+        return self
+
+    def change_col_type(self, columns: list[str], to_type: str) -> "TransformPlan":
+        for col in columns:
+            self.steps.append((col, "cast", TYPE_OPTS[to_type]))
+        return self
+
+    def apply_schema(self, schema: dict[str, str] = FEATURE_SCHEMA) -> "TransformPlan":
+        for col, dtype in schema.items():
+            if col in self.dataset.columns:
+                self.steps.append((col, "schema", dtype))
+        return self
+
+    def optimize(self) -> tuple[list[str], dict[str, list[tuple[str, Any]]]]:
+        """The columns that are kept and the merged operations of each one"""
+        removed = set()
+        chains = {}
+        for col, op, arg in self.steps:
+            if op == "remove":
+                for removed_col in arg:
+                    self.check_column(removed_col, removed)
+                    removed.add(removed_col)
+                    chains.pop(removed_col, None)
+                continue
+
+            if op == "schema" and col in removed:
+                continue
+            self.check_column(col, removed)
+            chain = chains.setdefault(col, [])
+            prev_op, prev_arg = chain[-1] if chain else (None, None)
+            if op == "map" and prev_op == "map" and not has_na_key(arg):
+                chain[-1] = ("map", merge_mappers(prev_arg, arg))
+            elif op == "cast" and prev_op == "cast" and arg is prev_arg:
+                continue
+            else:
+                chain.append((op, arg))
+
+        kept = [col for col in self.dataset.columns if col not in removed]
+        return kept, chains
+
+    def check_column(self, col: str, removed: set[str]) -> None:
+        if col not in self.dataset.columns or col in removed:
+            self.log("err", f"Column '{col}' is not in the dataset")
+
+    def execute(self) -> pd.DataFrame:
+        kept, chains = self.optimize()
+        n_ops = sum(len(chain) for chain in chains.values())
+        self.log(
+            "op",
+            f"Executing transformation plan: {len(self.steps)} steps -> "
+            + f"{n_ops} operations on {len(chains)} columns, "
+            + f"{len(self.dataset.columns) - len(kept)} columns removed",
+        )
+        columns = {
+            col: self.run_chain(self.dataset[col], chains[col])
+            if col in chains
+            else self.dataset[col]
+            for col in kept
+        }
+        return pd.DataFrame(columns, index=self.dataset.index, copy=False)
+
+    def run_chain(self, values: pd.Series, chain: list[tuple[str, Any]]) -> pd.Series:
+        for op, arg in chain:
+            if op == "map":
+                values = values.map(arg)
+            elif op == "cast":
+                values = values.astype(arg)
+            elif op == "schema":
+                dtype = self.transformer.schema_dtype(values, arg)
+                values = values.astype(dtype)
+            elif op == "vectorized":
+                values = pd.Series(arg(values), index=values.index, name=values.name)
+            else:
+                values = apply_distinct(values, arg)
+        return values
+
+
+def merge_mappers(first: dict, second: dict) -> dict:
+    """One mapping doing `Series.map(first).map(second)`: values `second` does
+    not map become NaN, as they would with `Series.map`
+    """
+    return {key: second.get(value, np.nan) for key, value in first.items()}
+
+
+def has_na_key(mapper: dict) -> bool:
+    # A NaN key would also map the values the first mapping leaves unmapped
+    return any(pd.isna(key) for key in mapper if np.ndim(key) == 0)
+
+
+def apply_distinct(values: pd.Series, func: Callable[..., Any]) -> pd.Series:
+    """`values.apply(func)`, calling `func` once per distinct value"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if len(uniques) > len(values) // 2:
+        return values.apply(func)
+    results = pd.Series(uniques).apply(func)
+    return pd.Series(
+        results.to_numpy().take(codes), index=values.index, name=values.name
+    )
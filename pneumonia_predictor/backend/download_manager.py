@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+import patoolib
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    DOWNLOAD_CACHE_DIR,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_TIMEOUT,
+)
+
+PROGRESS_STEPS = 10  # Progress is logged every 10% (or 64 chunks if size unknown)
+
+
+class DownloadManager(Logger):
+    """Downloads files into a content-addressed cache.
+
+    Layout of `cache_dir`:
+
+        objects/<sha256>         complete files, named by the hash of their content
+        urls/<sha256 of URL>     JSON record of the latest download of the URL
+        partial/<sha256 of URL>  download in progress
+        partial/<sha256 of URL>.validator  its ETag or Last-Modified header
+
+    Responses are streamed to the partial file in `chunk_size` chunks and
+    hashed on the way. An interrupted download is resumed with an HTTP Range
+    request, up to `retries` times, and every socket operation times out
+    after `timeout` seconds. The request carries the validator of the partial
+    file as If-Range, so it restarts from scratch when the file changed
+    upstream (or the server ignores the range, or gave no validator). A finished
+    download is checked against its expected SHA-256, if given, before it is
+    renamed into `objects/`, so a cached file is always complete.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DOWNLOAD_CACHE_DIR,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        timeout: float = DOWNLOAD_TIMEOUT,
+        retries: int = DOWNLOAD_RETRIES,
+    ) -> None:
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.executor = None
+        for subdir in ["objects", "urls", "partial"]:
+            (self.cache_dir / subdir).mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, sha256: str) -> Path:
+        return self.cache_dir / "objects" / sha256.lower()
+
+    def url_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def fetch(self, url: str, sha256: str | None = None) -> Path:
+        """Path of the cached content of `url`, downloaded unless the cache has
+        it already: by `sha256` if given, else by the latest download of `url`
+        """
+        record = self.read_record(url)
+        cached_sha256 = sha256 or (record or {}).get("sha256")
+        if cached_sha256 and self.object_path(cached_sha256).is_file():
+            self.log("inf", f"Found in download cache: {url}")
+            return self.object_path(cached_sha256)
+
+        digest = self.download(url)
+        part = self.cache_dir / "partial" / self.url_key(url)
+        validator_path(part).unlink(missing_ok=True)
+        if sha256 is not None and digest != sha256.lower():
+            part.unlink(missing_ok=True)
+            self.log(
+                "err",
+                f"Checksum mismatch for {url}: expected {sha256.lower()}, got {digest}",
+            )
+
+        os.replace(part, self.object_path(digest))
+        self.write_record(url, {"url": url, "sha256": digest, "time": time.time()})
+        return self.object_path(digest)
+
+    def download(self, url: str) -> str:
+        """Downloads `url` to its partial file and returns the SHA-256 of it"""
+        part = self.cache_dir / "partial" / self.url_key(url)
+        for attempt in range(self.retries + 1):
+            try:
+                return self.stream(url, part)
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    self.log("err", f"Download of {url} failed: HTTP {e.code}")
+                error = e
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                error = e
+            if attempt < self.retries:
+                self.log("inf", f"Download of {url} interrupted ({error}), resuming")
+                time.sleep(min(2**attempt * 0.5, 10))
+        self.log(
+            "err", f"Download of {url} failed after {self.retries} retries: {error}"
+        )
+
+    def stream(self, url: str, part: Path) -> str:
+        validator = (
+            validator_path(part).read_text()
+            if part.is_file() and validator_path(part).is_file()
+            else None
+        )
+        # Without a validator, the partial file may not match the current file
+        offset = part.stat().st_size if validator else 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+        try:
+            response = urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers), timeout=self.timeout
+            )
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or not offset:
+                raise
+            # Range not satisfiable: the partial file is stale, start over
+            part.unlink()
+            validator_path(part).unlink(missing_ok=True)
+            return self.stream(url, part)
+
+        with response:
+            content_range = response.headers.get("Content-Range", "")
+            if offset and not (
+                response.status == 206 and content_range.startswith(f"bytes {offset}-")
+            ):
+                # The file changed (If-Range failed) or the server ignored Range
+                offset = 0
+            if not offset:
+                self.write_validator(part, response.headers)
+            length = response.headers.get("Content-Length")
+            total = offset + int(length) if length is not None else None
+
+            if offset:
+                self.log("op", f"Resuming download of {url} at byte {offset}")
+                digest = hash_file(part, self.chunk_size)
+            else:
+                self.log("op", f"Downloading {url}")
+                digest = hashlib.sha256()
+
+            done = offset
+            next_report = 1
+            with open(part, "ab" if offset else "wb") as f:
+                while chunk := response.read(self.chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    done += len(chunk)
+                    progress = (
+                        done * PROGRESS_STEPS // total
+                        if total
+                        else done // (64 * self.chunk_size)
+                    )
+                    if progress >= next_report:
+                        next_report = progress + 1
+                        self.log("op", self.progress_msg(url, done, total))
+                f.flush()
+                os.fsync(f.fileno())
+
+        if total is not None and done < total:
+            raise ConnectionError(f"connection closed at byte {done} of {total}")
+        return digest.hexdigest()
+
+    def write_validator(self, part: Path, headers) -> None:
+        """Keeps what identifies the version being downloaded to `part`: a strong
+        ETag, else the Last-Modified date (If-Range accepts nothing weaker)
+        """
+        etag = headers.get("ETag")
+        validator = (
+            etag if etag and not etag.startswith("W/") else headers.get("Last-Modified")
+        )
+        if validator:
+            validator_path(part).write_text(validator)
+        else:
+            validator_path(part).unlink(missing_ok=True)
+
+    def progress_msg(self, url: str, done: int, total: int | None) -> str:
+        received = f"{done / 1024**2:.1f} MB"
+        if total:
+            received += f" of {total / 1024**2:.1f} MB ({done / total:.0%})"
+        return f"Downloaded {received}: {url}"
+
+    def read_record(self, url: str) -> dict | None:
+        path = self.cache_dir / "urls" / self.url_key(url)
+        return json.loads(path.read_text()) if path.is_file() else None
+
+    def write_record(self, url: str, record: dict) -> None:
+        path = self.cache_dir / "urls" / self.url_key(url)
+        tmp = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(record))
+        os.replace(tmp, path)
+
+    def materialize(self, cached: Path, dest: Path) -> bool:
+        """Copies the cached file to `dest` with a single rename, unless `dest`
+        has the same content already, and returns whether `dest` changed.
+
+        A copy rather than a hard link, so editing `dest` in place cannot
+        corrupt the cache.
+        """
+        if (
+            dest.is_file()
+            and dest.stat().st_size == cached.stat().st_size
+            and hash_file(dest, self.chunk_size).hexdigest() == cached.name
+        ):
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(cached, tmp)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return True
+
+    def extract_in_background(self, archive: Path, outdir: Path) -> Future:
+        """Extracts `archive` into `outdir` in a worker thread. The returned
+        future raises the extraction error, if any
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        return self.executor.submit(self.extract, archive, outdir)
+
+    def extract(self, archive: Path, outdir: Path) -> None:
+        """Extracts `archive` into a temporary directory next to `outdir`, then
+        moves every extracted entry into `outdir` with a single rename, so no
+        half-extracted file is ever visible there
+        """
+        self.log("op", f"Extracting archive: ./{archive}")
+        tmp = outdir / f".{archive.name}.{uuid4().hex}.extract"
+        try:
+            patoolib.extract_archive(str(archive), verbosity=-1, outdir=str(tmp))
+            for entry in tmp.iterdir():
+                target = outdir / entry.name
+                if target.is_dir() and not target.is_symlink():
+                    shutil.rmtree(target)
+                os.replace(entry, target)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.log("op", f"Extracted archive: ./{archive}")
+
+
+def validator_path(part: Path) -> Path:
+    return part.with_name(f"{part.name}.validator")
+
+
+def hash_file(path: Path, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> "hashlib._Hash":
+    """SHA-256 of the content of `path`, which can be updated further"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from pneumonia_predictor.backend.compiled_forest import CompiledForest
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    FEATURE_COLUMNS,
+    SAVED_MODELS,
+    SERVER_BATCH_WAIT_MS,
+    SERVER_HOST,
+    SERVER_MAX_BATCH_SIZE,
+    SERVER_METRICS_WINDOW,
+    SERVER_PORT,
+)
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+
+
+class RequestError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ServerMetrics:
+    def __init__(self, window: int = SERVER_METRICS_WINDOW) -> None:
+        self.latencies_ms = deque(maxlen=window)
+        self.latency_hist = Counter()
+        self.batch_size_hist = Counter()
+        self.n_requests = 0
+        self.n_batches = 0
+
+    def record_request(self, latency_ms: float) -> None:
+        self.n_requests += 1
+        self.latencies_ms.append(latency_ms)
+        bucket = next(b for b in LATENCY_BUCKETS_MS if latency_ms <= b)
+        self.latency_hist[bucket] += 1
+
+    def record_batch(self, batch_size: int) -> None:
+        self.n_batches += 1
+        # Power-of-two buckets: 1, 2, 4, 8, ...
+        self.batch_size_hist[1 << (batch_size - 1).bit_length()] += 1
+
+    def summary(self) -> dict:
+        latencies = np.array(self.latencies_ms)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0, 0)
+        return {
+            "requests": self.n_requests,
+            "batches": self.n_batches,
+            "latency_ms": {"p50": float(p50), "p99": float(p99)},
+            "latency_histogram_ms": {
+                f"le_{b}": self.latency_hist[b] for b in LATENCY_BUCKETS_MS
+            },
+            "batch_size_histogram": {
+                f"le_{b}": self.batch_size_hist[b] for b in sorted(self.batch_size_hist)
+            },
+        }
+
+
+class MicroBatcher:
+    """Groups the rows of concurrent requests into one `predict_with_proba` call.
+
+    A batch is closed once it holds `max_batch_size` rows or `max_wait_ms` has
+    passed since its first request arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        model: CompiledForest,
+        executor: ThreadPoolExecutor,
+        max_batch_size: int = SERVER_MAX_BATCH_SIZE,
+        max_wait_ms: float = SERVER_BATCH_WAIT_MS,
+    ) -> None:
+        self.model = model
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.metrics = ServerMetrics()
+
+    async def predict(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                n_rows += len(batch[-1][0])
+
+            self.metrics.record_batch(n_rows)
+            X = np.concatenate([rows for rows, _ in batch])
+            try:
+                predictions, probabilities = await loop.run_in_executor(
+                    self.executor, self.model.predict_with_proba, X
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for rows, future in batch:
+                stop = start + len(rows)
+                if not future.cancelled():
+                    future.set_result(
+                        (predictions[start:stop], probabilities[start:stop])
+                    )
+                start = stop
+
+
+class InferenceServer(Logger):
+    """Asyncio HTTP server for the saved models.
+
+    Endpoints:
+        POST /predict/<model>   body: {"records": [{feature: value, ...}, ...]}
+        GET  /metrics           latency and batch size statistics per model
+        GET  /health
+    """
+
+    def __init__(
+        self,
+        host: str = SERVER_HOST,
+        port: int = SERVER_PORT,
+        max_batch_size: int = SERVER_MAX_BATCH_SIZE,
+        max_wait_ms: float = SERVER_BATCH_WAIT_MS,
+        models: dict[str, str] = SAVED_MODELS,
+    ) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.models = {
+            name: CompiledForest.from_saved(saved_name)
+            for name, saved_name in models.items()
+        }
+        self.default_model = next(iter(self.models))
+
+    async def serve(self) -> None:
+        # One scoring thread per model keeps the event loop free while batching
+        self.executor = ThreadPoolExecutor(max_workers=len(self.models))
+        self.batchers = {
+            name: MicroBatcher(
+                model, self.executor, self.max_batch_size, self.max_wait_ms
+            )
+            for name, model in self.models.items()
+        }
+        workers = [asyncio.create_task(b.run()) for b in self.batchers.values()]
+
+        server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port
+        )
+        self.log("inf", f"Inference server listening on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.executor.shutdown(wait=False)
+
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = await self.read_headers(reader)
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_headers(self, reader: asyncio.StreamReader) -> dict[str, str]:
+        headers = {}
+        while (line := await reader.readline()) not in {b"\r\n", b"\n", b""}:
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+    async def dispatch(
+        self, method: str, path: str, body: bytes
+    ) -> tuple[HTTPStatus, dict]:
+        try:
+            if method == "GET" and path == "/health":
+                return HTTPStatus.OK, {"status": "ok", "models": list(self.models)}
+            if method == "GET" and path == "/metrics":
+                return HTTPStatus.OK, {
+                    name: batcher.metrics.summary()
+                    for name, batcher in self.batchers.items()
+                }
+            if method == "POST" and path.startswith("/predict"):
+                model_name = path.removeprefix("/predict").strip("/")
+                return HTTPStatus.OK, await self.predict(
+                    model_name or self.default_model, body
+                )
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown route: {method} {path}")
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            self.log("inf", f"Request failed: {method} {path}: {e!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+
+    async def predict(self, model_name: str, body: bytes) -> dict:
+        if model_name not in self.batchers:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown model: {model_name}")
+
+        start = time.perf_counter()
+        rows = self.parse_records(body)
+        predictions, probabilities = await self.batchers[model_name].predict(rows)
+        self.batchers[model_name].metrics.record_request(
+            (time.perf_counter() - start) * 1000
+        )
+        return {
+            "model": model_name,
+            "predictions": predictions.tolist(),
+            "probabilities": probabilities.tolist(),
+        }
+
+    def parse_records(self, body: bytes) -> np.ndarray:
+        """Accepts {"records": [...]} or a bare list of records, where a record is
+        either an object keyed by feature name or a list in `FEATURE_COLUMNS` order
+        """
+        try:
+            records = json.loads(body)
+            if isinstance(records, dict):
+                records = records["records"]
+            if not isinstance(records, list):
+                raise TypeError("records must be a list")
+            rows = [self.parse_record(record) for record in records]
+            X = np.array(rows, dtype=np.float32).reshape(-1, len(FEATURE_COLUMNS))
+        except (KeyError, TypeError, ValueError) as e:
+            raise RequestError(
+                HTTPStatus.BAD_REQUEST,
+                f"Invalid records ({e!r}); expected features: {FEATURE_COLUMNS}",
+            )
+        if len(X) == 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "No records to predict")
+        return X
+
+    def parse_record(self, record: dict | list) -> list:
+        if isinstance(record, dict):
+            return [record[col] for col in FEATURE_COLUMNS]
+        # A flat list of numbers would otherwise be reshaped into several records
+        if not isinstance(record, list) or len(record) != len(FEATURE_COLUMNS):
+            raise ValueError(
+                f"a record must be an object or a list of {len(FEATURE_COLUMNS)} "
+                f"values, got {record!r}"
+            )
+        return record
+
+    def write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        payload: dict,
+        keep_alive: bool,
+    ) -> None:
+        body = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            + "Content-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\n"
+            + f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+
+    def __str__(self) -> str:
+        return f"Inference Server ({self.host}:{self.port})"
@@ -1,17 +1,192 @@
+import atexit
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
+from queue import Empty, SimpleQueue
 from sys import exit
 
-from pneumonia_predictor.config import LOGFILE_ENABLED, LOGFILE_LOC, LOGS_ENABLED
+from pneumonia_predictor.config import (
+    LOG_FLUSH_INTERVAL,
+    LOG_LEVEL,
+    LOGFILE_ENABLED,
+    LOGFILE_LOC,
+    LOGS_ENABLED,
+)
+
+TIME_LOG_FMT = "%d/%m/%Y - %H:%M:%S"
+LOG_LEVELS = {"op": 10, "sep": 20, "inf": 20, "err": 40}
+RECORD_FORMATS = {
+    "op": "[{time}][OP]: {message}.",
+    "inf": "[{time}][INFO]: {message}",
+    "sep": "{message}",
+    "err": "[{time}][ERROR]: {message}. Exiting...\n",
+}
+
+
+class LogWriter:
+    """Appends log records to a file from a background thread.
+
+    `write` only puts the record on a queue. The writer thread formats the
+    queued records (timestamps are formatted once per second) and appends them
+    to the file with one write per batch, at most every `flush_interval`
+    seconds. If the thread has died, `write` and `flush` append to the file
+    directly, so a failing write raises in the caller.
+    """
+
+    def __init__(self, logfile_loc: str, flush_interval: float = LOG_FLUSH_INTERVAL):
+        self.logfile_loc = logfile_loc
+        self.flush_interval = flush_interval
+        self.queue = SimpleQueue()
+        self.lock = threading.Lock()
+        self.unwritten = []  # records the writer thread failed to write
+        self.last_second = None
+        self.last_time = ""
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, log_type: str, message: str) -> None:
+        record = (time.time(), log_type, message)
+        if self.running():
+            self.queue.put(record)
+            return
+        # The writer thread died (e.g. the log folder is missing): write here, so
+        # the error surfaces in the caller instead of records piling up unwritten
+        self.append_directly([record])
+
+    def running(self) -> bool:
+        if self.unwritten:  # Set by the writer thread as it fails
+            self.thread.join()
+        return self.thread.is_alive()
+
+    def append_directly(self, records: list[tuple]) -> None:
+        """Appends the records left by the writer thread, the queued ones and
+        `records` in the caller's thread
+        """
+        with self.lock:
+            records = [*self.unwritten, *self.drain(), *records]
+            try:
+                self.append([self.format(r) for r in records])
+            except OSError:
+                self.unwritten = records  # Kept for the next write
+                raise
+            self.unwritten = []
+
+    def drain(self) -> list[tuple]:
+        records = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except Empty:
+                return records
+            if isinstance(record, tuple):
+                records.append(record)
+            elif isinstance(record, threading.Event):
+                record.set()
+
+    def flush(self) -> None:
+        """Blocks until every record queued so far is written, or raises the
+        error that kept them from being written
+        """
+        if self.running():
+            done = threading.Event()
+            self.queue.put(done)
+            # The thread may die before it gets to `done`
+            while not done.wait(self.flush_interval) and self.thread.is_alive():
+                pass
+        if not self.running():
+            self.append_directly([])
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def run(self) -> None:
+        while True:
+            records = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # Batch whatever arrives until the deadline, a flush or a close
+            while isinstance(records[-1], tuple):
+                try:
+                    records.append(
+                        self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except Empty:
+                    break
+
+            try:
+                self.append([self.format(r) for r in records if isinstance(r, tuple)])
+            except OSError:
+                # Left for `write` and `flush`, which retry in the caller's thread
+                self.unwritten = [r for r in records if isinstance(r, tuple)]
+                return
+            finally:
+                # Waiting flushes return even if the thread dies
+                if isinstance(records[-1], threading.Event):
+                    records[-1].set()
+            if records[-1] is None:
+                return
+
+    def format(self, record: tuple) -> str:
+        created, log_type, message = record
+        second = int(created)
+        if second != self.last_second:
+            self.last_second = second
+            self.last_time = datetime.fromtimestamp(second).strftime(TIME_LOG_FMT)
+        return RECORD_FORMATS[log_type].format(time=self.last_time, message=message)
+
+    def append(self, lines: list[str]) -> None:
+        if not lines:
+            return
+        with open(self.logfile_loc, "a") as logfile:
+            logfile.write("\n".join(lines) + "\n")
+
+
+_writers: dict[str, LogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(logfile_loc: str) -> LogWriter:
+    with _writers_lock:
+        if logfile_loc not in _writers:
+            _writers[logfile_loc] = LogWriter(logfile_loc)
+        return _writers[logfile_loc]
+
+
+def flush_all() -> None:
+    for writer in list(_writers.values()):
+        writer.flush()
+
+
+@atexit.register
+def close_all() -> None:
+    for writer in list(_writers.values()):
+        writer.close()
+
+
+def _reset_after_fork() -> None:
+    # Writer threads do not survive a fork; the child starts its own
+    global _writers_lock
+    _writers.clear()
+    _writers_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 class Logger:
     def __init__(
-        self, logfile_enabled: bool = LOGFILE_ENABLED, logfile_loc: str = LOGFILE_LOC
+        self,
+        logfile_enabled: bool = LOGFILE_ENABLED,
+        logfile_loc: str = LOGFILE_LOC,
+        log_level: str = LOG_LEVEL,
     ) -> None:
-        self.time_log_fmt = "%d/%m/%Y - %H:%M:%S"
+        self.time_log_fmt = TIME_LOG_FMT
         self.logfile_enabled = logfile_enabled
         self.logfile_loc = logfile_loc
+        self.min_level = LOG_LEVELS[log_level]
         self.log_types = {
             "err": lambda m: self.raise_error(m),
             "op": lambda m: self.log_operation(m),
@@ -20,23 +195,30 @@ class Logger:
         }
 
     def log(self, log_type: str, message: str) -> None:
-        if not LOGS_ENABLED:
+        if log_type == "err":
+            self.raise_error(message)
+        if not LOGS_ENABLED or LOG_LEVELS[log_type] < self.min_level:
             return None
         self.log_types[log_type](message)
 
     def raise_error(self, message: str) -> None:
-        output = f"[{self.get_curr_datetime}][ERROR]: {message}. Exiting...\n"
-        self.update_logfile(output)
+        output = f"[{self.get_curr_datetime()}][ERROR]: {message}. Exiting...\n"
+        if LOGS_ENABLED:
+            try:
+                self.update_logfile(message, "err")
+                self.flush()
+            except OSError:
+                pass  # The error is still printed on exit
         exit(output)
 
     def log_operation(self, message: str) -> None:
-        self.update_logfile(f"[{self.get_curr_datetime()}][OP]: {message}.")
+        self.update_logfile(message, "op")
 
     def log_info(self, message: str) -> None:
-        self.update_logfile(f"[{self.get_curr_datetime()}][INFO]: {message}")
+        self.update_logfile(message, "inf")
 
     def sep(self, chosen_char: str, n_chars: int = 50) -> None:
-        self.update_logfile(chosen_char * n_chars)
+        self.update_logfile(chosen_char * n_chars, "sep")
 
     def get_curr_datetime(self) -> str:
         curr_datetime = datetime.now()
@@ -45,8 +227,13 @@ class Logger:
     def create_logs_file(self) -> None:
         out_file = Path(self.logfile_loc)
         out_file.parent.mkdir(exist_ok=True, parents=True)
+        self.flush()
         out_file.write_text(f"TRAINING LOGS (Created at: {self.get_curr_datetime()})\n")
 
-    def update_logfile(self, new_log: str) -> None:
-        with open(self.logfile_loc, "a") as logfile:
-            logfile.write(new_log + "\n")
+    def update_logfile(self, new_log: str, log_type: str = "sep") -> None:
+        if self.logfile_enabled:
+            get_writer(self.logfile_loc).write(log_type, new_log)
+
+    def flush(self) -> None:
+        if self.logfile_enabled:
+            get_writer(self.logfile_loc).flush()
@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+from pandas import DataFrame
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    MEMORY_BUDGET_MB,
+    MEMORY_PROFILING_ENABLED,
+    PROFILING_ENABLED,
+)
+
+NULL_SPAN = nullcontext()
+RECORD_COLUMNS = ["run", "iteration", "stage", "duration", "rows", "rows_per_sec"]
+MEMORY_COLUMNS = ["rss_mb", "rss_delta_mb", "max_rss_mb", "traced_peak_mb"]
+MB = 1024**2
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Profilers sharing the tracemalloc session they started; the last one stops it
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+
+def acquire_tracing() -> bool:
+    """Starts tracemalloc or joins the session profilers started. Returns
+    False, leaving it alone, if the session was started by someone else
+    """
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0:
+            if tracemalloc.is_tracing():
+                return False
+            tracemalloc.start()
+        _tracing_users += 1
+        return True
+
+
+def release_tracing() -> None:
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+
+def current_rss() -> int | None:
+    """Resident set size of this process in bytes (None without /proc)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+def max_rss() -> int | None:
+    """Highest resident set size of this process so far, in bytes"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Span:
+    __slots__ = (
+        "profiler",
+        "stage",
+        "rows",
+        "start",
+        "rss_start",
+        "traced_start",
+        "child_peak",
+    )
+
+    def __init__(self, profiler: "Profiler", stage: str, rows: int | None) -> None:
+        self.profiler = profiler
+        self.stage = stage
+        self.rows = rows
+
+    def __enter__(self) -> "Span":
+        profiler = self.profiler
+        if profiler.memory_budget_mb is not None:
+            profiler.check_budget(self.stage)
+        if profiler.track_memory:
+            self.rss_start = current_rss()
+            self.child_peak = 0
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                # An enclosing span keeps its peak before this span resets it
+                if profiler.stack:
+                    parent = profiler.stack[-1]
+                    parent.child_peak = max(parent.child_peak, peak)
+                tracemalloc.reset_peak()
+                self.traced_start = current
+            profiler.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        duration = time.perf_counter() - self.start
+        profiler = self.profiler
+        record = {
+            "run": profiler.run,
+            "iteration": profiler.iteration,
+            "stage": self.stage,
+            "duration": duration,
+            "rows": self.rows,
+            "rows_per_sec": self.rows / duration
+            if self.rows is not None and duration > 0
+            else None,
+        }
+        if profiler.track_memory:
+            profiler.stack.pop()
+            rss = current_rss()
+            record["rss_mb"] = rss / MB if rss is not None else None
+            record["rss_delta_mb"] = (
+                (rss - self.rss_start) / MB if rss is not None else None
+            )
+            peak_rss = max_rss()
+            record["max_rss_mb"] = peak_rss / MB if peak_rss is not None else None
+            if tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+                record["traced_peak_mb"] = (peak - self.traced_start) / MB
+                if profiler.stack:
+                    parent = profiler.stack[-1]
+                    parent.child_peak = max(parent.child_peak, peak)
+        profiler.records.append(record)
+        if profiler.memory_budget_mb is not None and exc[0] is None:
+            profiler.check_budget(self.stage)
+
+
+class Profiler(Logger):
+    """Times the stages of a training run.
+
+    `with profiler.span("classifier.fit", rows=n):` records the stage's duration,
+    row count and throughput under the current `run` and `iteration`. With
+    `track_memory`, spans also record the process RSS and the peak memory
+    allocated during the span (tracemalloc, which also sees NumPy arrays).
+    Allocations are traced from `start_run` to `end_run`, so the spans of the
+    model's construction (run 0) only record the RSS. Profilers running at the
+    same time share one tracemalloc session, stopped after the last run ends,
+    and leave alone a session started by other code.
+    With `memory_budget_mb`, the run stops with a report of the heaviest stages
+    as soon as the RSS, plus any announced allocation, goes over the budget.
+    When all of this is off, `span` returns a shared no-op context manager.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PROFILING_ENABLED,
+        track_memory: bool = MEMORY_PROFILING_ENABLED,
+        memory_budget_mb: float | None = MEMORY_BUDGET_MB,
+        trace_allocations: bool = True,
+    ) -> None:
+        super().__init__()
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.memory_budget_mb = memory_budget_mb
+        # tracemalloc peaks per span; RSS alone is much cheaper to track
+        self.trace_allocations = trace_allocations
+        self.records = []
+        self.stack = []  # open spans, when tracking memory
+        self.started_tracing = False
+        # Spans before the first `start_run` (the model's construction) are run 0
+        self.run = 0
+        self.iteration = 0
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or self.track_memory or self.memory_budget_mb is not None
+
+    def span(self, stage: str, rows: int | None = None) -> Span | nullcontext:
+        if not self.active:
+            return NULL_SPAN
+        return Span(self, stage, rows)
+
+    def start_run(self) -> None:
+        """Starts a new run; its spans are recorded from iteration 0"""
+        self.run += 1
+        self.iteration = 0
+        if self.track_memory and self.trace_allocations and not self.started_tracing:
+            self.started_tracing = acquire_tracing()
+
+    def end_run(self) -> None:
+        if self.started_tracing:
+            release_tracing()
+            self.started_tracing = False
+        self.log_summary()
+
+    def check_budget(self, stage: str, extra_bytes: int = 0) -> None:
+        """Stops with a memory report when the RSS plus `extra_bytes` (an
+        allocation about to happen) is over `memory_budget_mb`
+        """
+        if self.memory_budget_mb is None:
+            return
+        rss = current_rss()
+        if rss is None or (rss + extra_bytes) / MB <= self.memory_budget_mb:
+            return
+
+        report = f"RSS {rss / MB:.0f} MB"
+        if extra_bytes:
+            report += f" + {extra_bytes / MB:.0f} MB requested"
+        if self.track_memory and self.records:
+            heaviest = (
+                self.to_frame()
+                .groupby("stage")["traced_peak_mb"]
+                .max()
+                .nlargest(3)
+                .dropna()
+            )
+            report += "; peak allocations: " + ", ".join(
+                f"{name} {peak:.0f} MB" for name, peak in heaviest.items()
+            )
+        self.log(
+            "err",
+            f"Memory budget of {self.memory_budget_mb:.0f} MB exceeded at {stage} "
+            + f"(run {self.run}, iteration {self.iteration}): {report}",
+        )
+
+    def to_frame(self) -> DataFrame:
+        columns = RECORD_COLUMNS + (MEMORY_COLUMNS if self.track_memory else [])
+        return DataFrame(self.records, columns=columns)
+
+    def summary(self, run: int | None = None) -> DataFrame:
+        """Total, mean and max duration and throughput of every stage of `run`,
+        and its memory peaks when tracked. By default, the stages of the latest
+        run and of the model's construction (run 0)
+        """
+        records = self.to_frame()
+        runs = [run] if run is not None else [0, self.run]
+        records = records[records["run"].isin(runs)]
+        aggregations = {
+            "calls": ("duration", "size"),
+            "total": ("duration", "sum"),
+            "mean": ("duration", "mean"),
+            "max": ("duration", "max"),
+            "rows": ("rows", "sum"),
+        }
+        if self.track_memory:
+            aggregations["rss_mb"] = ("rss_mb", "max")
+            aggregations["max_rss_mb"] = ("max_rss_mb", "max")
+            aggregations["traced_peak_mb"] = ("traced_peak_mb", "max")
+        summary = records.groupby("stage", sort=False).agg(**aggregations)
+        summary["rows_per_sec"] = summary["rows"] / summary["total"]
+        summary["share"] = summary["total"] / summary["total"].sum()
+        return summary.sort_values("total", ascending=False)
+
+    def log_summary(self) -> None:
+        if not self.records or not (self.enabled or self.track_memory):
+            return
+        self.log("inf", f"Stage timings of run {self.run}")
+        for stage, row in self.summary().iterrows():
+            memory = (
+                f", RSS {row['rss_mb']:.0f} MB (high-water {row['max_rss_mb']:.0f} MB), "
+                + f"peak +{row['traced_peak_mb']:.0f} MB"
+                if self.track_memory
+                else ""
+            )
+            self.log(
+                "inf",
+                f"{stage}: {row['total']:.3f}s total ({row['share']:.0%}), "
+                + f"{int(row['calls'])} calls, {row['rows_per_sec']:,.0f} rows/s"
+                + memory,
+            )
+
+    def export(self, path: str) -> None:
+        """Writes every recorded span to a `.json` or `.csv` file"""
+        out_file = Path(path)
+        if out_file.suffix not in {".json", ".csv"}:
+            self.log(
+                "err", f"Unknown profile format: {out_file.suffix}. Allowed: json, csv"
+            )
+        out_file.parent.mkdir(exist_ok=True, parents=True)
+        records = self.to_frame()
+        if out_file.suffix == ".json":
+            records.to_json(out_file, orient="records", indent=2)
+        else:
+            records.to_csv(out_file, index=False)
+        self.log("inf", f"Profile of {len(records)} spans saved at {out_file}")
@@ -1,24 +1,54 @@
+import json
 import statistics
 from collections import defaultdict
 from pathlib import Path
 
 import joblib
 import matplotlib.pyplot as plt
-from pandas import DataFrame, concat
+import numpy as np
+from pandas import DataFrame
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 
 from pneumonia_predictor.backend.active_smote import ActiveSMOTE
+from pneumonia_predictor.backend.synthetic_store import SyntheticSampleStore
+from pneumonia_predictor.backend.training_cache import (
+    json_default,
+    training_fingerprint,
+)
+from pneumonia_predictor.backend.utils import oob_classification_report
 from pneumonia_predictor.config import (
+    CLUSTER_WARM_START,
+    CLUSTERING_BACKEND,
+    EVALUATION_MODE,
     N_CLUSTERS,
     N_ESTIMATORS,
     N_ITERATIONS,
+    PROBABILITY_SOURCE,
+    RANDOM_STATE,
     SAMPLING_RATIO,
     SAVED_MODELS_PATH,
+    SMOTE_PER_CLUSTER,
+    TREES_PER_ITERATION,
+    UNCERTAINTY_MEASURE,
 )
 
 
 class RfActiveSMOTE(ActiveSMOTE):
+    # The results of `train`, restored by `TrainingCache` on a cache hit
+    cached_attrs = [
+        "classifier",
+        "n_iterations",
+        "current_report",
+        "min_class_stats",
+        "maj_class_stats",
+        "macro_avg",
+        "accuracy_stats",
+        "overall_macro_avg",
+        "overall_accuracy",
+        "holdout_report",
+    ]
+
     def __init__(
         self,
         X_train: DataFrame,
@@ -30,8 +60,32 @@ class RfActiveSMOTE(ActiveSMOTE):
         num_est: int = N_ESTIMATORS,
         num_clusters: int = N_CLUSTERS,
         sampling_ratio: float = SAMPLING_RATIO,
+        trees_per_iteration: int | None = TREES_PER_ITERATION,
+        random_state: int = RANDOM_STATE,
+        clustering_backend: str = CLUSTERING_BACKEND,
+        cluster_warm_start: bool = CLUSTER_WARM_START,
+        uncertainty_measure: str = UNCERTAINTY_MEASURE,
+        probability_source: str = PROBABILITY_SOURCE,
+        evaluation_mode: str = EVALUATION_MODE,
+        smote_per_cluster: bool = SMOTE_PER_CLUSTER,
     ) -> None:
         self.probabilities = []
+        # Constructor arguments besides the data, to build fresh copies of the model
+        self.params = {
+            "target_name": target_name,
+            "categ_features": categ_features,
+            "num_est": num_est,
+            "num_clusters": num_clusters,
+            "sampling_ratio": sampling_ratio,
+            "trees_per_iteration": trees_per_iteration,
+            "random_state": random_state,
+            "clustering_backend": clustering_backend,
+            "cluster_warm_start": cluster_warm_start,
+            "uncertainty_measure": uncertainty_measure,
+            "probability_source": probability_source,
+            "evaluation_mode": evaluation_mode,
+            "smote_per_cluster": smote_per_cluster,
+        }
 
         super().__init__(
             X_train,
@@ -40,14 +94,47 @@ class RfActiveSMOTE(ActiveSMOTE):
             target_name,
             categ_features,
             num_clusters,
+            random_state,
+            clustering_backend,
+            cluster_warm_start,
+            uncertainty_measure,
+            smote_per_cluster,
         )
 
         self.X_test = X_test
         self.y_test = y_test
 
-        self.classifier = RandomForestClassifier(n_estimators=num_est, random_state=42)
+        self.num_est = num_est
+        self.trees_per_iteration = trees_per_iteration
+        if probability_source not in {"oob", "predict"}:
+            self.log(
+                "err",
+                f"Unknown probability source: {probability_source}. "
+                + "Allowed: oob, predict",
+            )
+        if evaluation_mode not in {"holdout", "oob"}:
+            self.log(
+                "err",
+                f"Unknown evaluation mode: {evaluation_mode}. Allowed: holdout, oob",
+            )
+        # Warm-started trees keep their bootstrap, but sklearn rebuilds it from
+        # the seed and the current row count: their OOB rows are not out-of-bag
+        if trees_per_iteration and "oob" in {probability_source, evaluation_mode}:
+            self.log(
+                "err",
+                "Out-of-bag estimates are biased when trees are warm-started: "
+                + "use probability_source='predict' and evaluation_mode='holdout' "
+                + "with trees_per_iteration",
+            )
+        self.probability_source = probability_source
+        self.evaluation_mode = evaluation_mode
+        self.classifier = RandomForestClassifier(
+            n_estimators=num_est,
+            random_state=random_state,
+            oob_score="oob" in {probability_source, evaluation_mode},
+        )
         # stores all synthetic samples throughout the iteration
-        self.total_synthetic_samples = DataFrame()
+        self.synthetic_store = SyntheticSampleStore(list(X_train.columns), target_name)
 
         self.current_ratio = sampling_ratio
 
@@ -57,42 +144,112 @@ class RfActiveSMOTE(ActiveSMOTE):
     def train(self, n_iterations: int = N_ITERATIONS) -> None:
         self.init_stats()
         self.n_iterations = n_iterations
+        # Every run starts from the same seeds and data: equal inputs give equal
+        # results, which TrainingCache relies on
+        self.rng = np.random.default_rng(self.random_state)
+        self.clusterer.cluster_centers_ = None
+        self.train_buffer.reset()
+        self.profiler.start_run()
+
+        if self.trees_per_iteration:
+            # A shared RandomState keeps handing out fresh seeds to regrown trees
+            self.classifier.set_params(
+                warm_start=False,
+                random_state=np.random.RandomState(self.random_state),
+            )
 
         self.log("sep", "=")
         self.log("op", "Initial training starts")
         self.fit_classifier()
-        self.probabilities = self.classifier.predict_proba(self.X_train)
 
         self.log("sep", "=")
         self.log("op", "Model resampling starts")
         for i in range(n_iterations):
             self.log("sep", "=")
             self.log("inf", f"ITERATION {i + 1}")
+            self.profiler.iteration = i + 1
 
-            self.uncertainty_sampling()
+            self.refresh_probabilities()
+            with self.profiler.span("uncertainty_sampling", self.n_train):
+                self.uncertainty_sampling()
             self.diversity_sampling()
 
-            self.create_synthetic_samples(self.current_ratio)
-            self.total_synthetic_samples = concat(
-                [self.total_synthetic_samples, self.current_synthetic_samples], axis=1
+            self.create_synthetic_samples(self.current_ratio, i + 1)
+            self.synthetic_store.append(
+                self.X_synthetic, self.y_synthetic, i + 1, self.synthetic_clusters
             )
+            if self.trees_per_iteration:
+                self.replace_oldest_trees()
             self.fit_classifier()
 
             self.record_curr_iteration()
         self.record_overall_res()
+        self.holdout_report = (
+            self.evaluate_holdout()
+            if self.evaluation_mode == "oob"
+            else self.current_report
+        )
         self.log("inf", "Retraining done")
+        self.profiler.end_run()
 
     def fit_classifier(self):
         self.log("op", "Process classifier.fit started")
-        self.classifier.fit(
-            self.X_train_resampled,
-            self.y_train_resampled[self.target_name].values.ravel(),
-        )
+        with self.profiler.span("classifier.fit", len(self.train_buffer)):
+            self.classifier.fit(self.X_train_resampled, self.train_buffer.y)
+        if self.evaluation_mode == "oob":
+            self.log("op", "Computing out-of-bag classification report")
+            n_original = self.train_buffer.n_original
+            with self.profiler.span("classification_report", n_original):
+                self.current_report = oob_classification_report(
+                    self.classifier, self.train_buffer.y[:n_original]
+                )
+        else:
+            self.current_report = self.evaluate_holdout()
+
+    def evaluate_holdout(self) -> dict:
+        """Classification report of the current forest on the test set"""
         self.log("op", "Process classifier.predict started")
-        self.y_pred = self.classifier.predict(self.X_test)
-        self.current_report = classification_report(
-            self.y_test, self.y_pred, output_dict=True
-        )
+        with self.profiler.span("classifier.predict", len(self.X_test)):
+            self.y_pred = self.classifier.predict(self.X_test)
+        with self.profiler.span("classification_report", len(self.y_test)):
+            return classification_report(self.y_test, self.y_pred, output_dict=True)
+
+    def refresh_probabilities(self) -> None:
+        """Class probabilities of the original training rows from the latest fit.
+
+        `oob` reuses the out-of-bag estimates computed during `classifier.fit`, so
+        no extra prediction pass is needed. It is only allowed when the whole
+        forest is refit, since the estimates would include the training rows of
+        warm-started trees.
+        """
+        self.log("op", f"Refreshing class probabilities ({self.probability_source})")
+        if self.probability_source == "oob":
+            self.probabilities = self.classifier.oob_decision_function_[
+                : self.train_buffer.n_original
+            ]
+        else:
+            self.probabilities = self.classifier.predict_proba(self.X_train)
+
+    @property
+    def total_synthetic_samples(self) -> DataFrame:
+        return self.synthetic_store.to_frame()
+
+    def rollback(self, iteration: int) -> None:
+        """Discards the synthetic samples of `iteration` and every later one from
+        both the synthetic store and the training set. Call `fit_classifier` to
+        refit the forest on what is left.
+        """
+        self.synthetic_store.rollback(iteration)
+        self.train_buffer.rollback(iteration)
+
+    def replace_oldest_trees(self) -> None:
+        """Drops the oldest trees so the next `fit_classifier` only grows
+        `trees_per_iteration` new trees on the resampled set (warm start)
+        """
+        n_replaced = min(self.trees_per_iteration, self.num_est)
+        self.log("op", f"Replacing {n_replaced} of {self.num_est} trees")
+        self.classifier.estimators_ = self.classifier.estimators_[n_replaced:]
+        self.classifier.set_params(warm_start=True, n_estimators=self.num_est)
 
     def record_curr_iteration(self) -> None:
         self.accuracy_stats.append(self.current_report["accuracy"])
@@ -145,7 +302,7 @@ class RfActiveSMOTE(ActiveSMOTE):
 
     def init_stats(self) -> None:
         self.probabilities = []
-        self.total_synthetic_samples = DataFrame()
+        self.synthetic_store.clear()
         self.min_class_stats = defaultdict(list)
         self.maj_class_stats = defaultdict(list)
         self.macro_avg = defaultdict(list)
@@ -155,7 +312,16 @@ class RfActiveSMOTE(ActiveSMOTE):
         models_path = Path(SAVED_MODELS_PATH)
         models_path.mkdir(exist_ok=True)
         joblib.dump(self.classifier, f"{SAVED_MODELS_PATH}/{model_name}.pkl")
-        self.log("inf", f"Pickle {model_name}.pkl saved at ./{SAVED_MODELS_PATH}")
+        # What the model was trained with: parameters, seeds, config and data hash
+        fingerprint = training_fingerprint(self, {"n_iterations": self.n_iterations})
+        Path(f"{SAVED_MODELS_PATH}/{model_name}.json").write_text(
+            json.dumps(fingerprint, indent=2, default=json_default)
+        )
+        self.log(
+            "inf",
+            f"Pickle {model_name}.pkl and its training record {model_name}.json "
+            + f"saved at ./{SAVED_MODELS_PATH}",
+        )
 
     def __str__(self) -> str:
         return "Random Forest + Active SMOTE Model"
@@ -1,17 +1,37 @@
+import json
 from collections import Counter
 from pathlib import Path
 
 import joblib
-from imblearn.over_sampling import SMOTENC
+import numpy as np
 from pandas import DataFrame, concat
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 
 from pneumonia_predictor.backend.logger import Logger
-from pneumonia_predictor.config import N_ESTIMATORS, SAVED_MODELS_PATH
+from pneumonia_predictor.backend.profiler import Profiler
+from pneumonia_predictor.backend.smote_generator import SmoteGenerator
+from pneumonia_predictor.backend.training_buffer import TrainingBuffer
+from pneumonia_predictor.backend.training_cache import (
+    json_default,
+    training_fingerprint,
+)
+from pneumonia_predictor.config import (
+    N_ESTIMATORS,
+    RANDOM_STATE,
+    SAVED_MODELS_PATH,
+)
 
 
 class RfSMOTE(Logger):
+    # The results of `train`, restored by `TrainingCache` on a cache hit
+    cached_attrs = [
+        "classifier",
+        "report",
+        "overall_accuracy",
+        "overall_weighted_avg",
+    ]
+
     def __init__(
         self,
         X_train: DataFrame,
@@ -21,9 +41,16 @@ class RfSMOTE(Logger):
         target_name: str,
         categ_features: list[int],
         num_est: int = N_ESTIMATORS,
+        random_state: int = RANDOM_STATE,
     ) -> None:
         super().__init__()
-
+        # Constructor arguments besides the data, to build fresh copies of the model
+        self.params = {
+            "target_name": target_name,
+            "categ_features": categ_features,
+            "num_est": num_est,
+            "random_state": random_state,
+        }
         self.target_name = target_name
         self.categ_features = categ_features
         self.X_train = X_train
@@ -31,40 +58,58 @@ class RfSMOTE(Logger):
         self.X_test = X_test
         self.y_test = y_test
 
-        self.X_train_resampled = X_train.copy()
-        self.y_train_resampled = y_train.copy()
+        self.profiler = Profiler()
+        with self.profiler.span("RfSMOTE.__init__", len(X_train)):
+            self.train_buffer = TrainingBuffer(X_train, y_train, target_name)
 
         self.maj_class_val = y_train.value_counts().idxmax()[0]
         self.min_class_val = y_train.value_counts().idxmin()[0]
 
-        self.classifier = RandomForestClassifier(n_estimators=num_est, random_state=42)
-        self.smote = SMOTENC(
-            sampling_strategy="not majority", categorical_features=self.categ_features
+        self.classifier = RandomForestClassifier(
+            n_estimators=num_est, random_state=random_state
         )
+        self.rng = np.random.default_rng(random_state)
+        self.smote_generator = None  # built on first use, then reused
+
+    @property
+    def X_train_resampled(self) -> DataFrame:
+        return self.train_buffer.X_frame()
+
+    @property
+    def y_train_resampled(self) -> DataFrame:
+        return self.train_buffer.y_frame()
 
     def train(self) -> None:
         self.log("sep", "=")
         self.log("op", "Training starts")
+        self.profiler.start_run()
+        # Every run starts from the same seed and data: equal inputs give equal
+        # results, which TrainingCache relies on
+        self.init_stats()
+        self.rng = np.random.default_rng(self.params["random_state"])
         self.create_synthetic_samples()
         self.fit_classifier()
+        self.profiler.end_run()
 
     def fit_classifier(self) -> None:
         self.log("op", "Process classifier.fit started")
-        self.classifier.fit(
-            self.X_train_resampled,
-            self.y_train_resampled[self.target_name].values.ravel(),
-        )
-        self.log("op", "Process classifier.predict started")
-        self.y_pred = self.classifier.predict(self.X_test)
-        self.report = classification_report(self.y_test, self.y_pred, output_dict=True)
+        with self.profiler.span("classifier.fit", len(self.train_buffer)):
+            self.classifier.fit(self.X_train_resampled, self.train_buffer.y)
+        self.report = self.evaluate_holdout()
         self.overall_accuracy = self.report["accuracy"]
         self.overall_weighted_avg = self.report["weighted avg"]
         self.log("op", "Classification report generated")
 
+    def evaluate_holdout(self) -> dict:
+        """Classification report of the current forest on the test set"""
+        self.log("op", "Process classifier.predict started")
+        with self.profiler.span("classifier.predict", len(self.X_test)):
+            self.y_pred = self.classifier.predict(self.X_test)
+        with self.profiler.span("classification_report", len(self.y_test)):
+            return classification_report(self.y_test, self.y_pred, output_dict=True)
+
     def create_synthetic_samples(self) -> None:
-        self.min_maj_count = Counter(
-            self.y_train_resampled[self.target_name].to_numpy()
-        )
+        self.min_maj_count = Counter(self.train_buffer.y)
         self.log(
             "inf",
             f"Minority/Majority count: {self.min_maj_count[self.min_class_val]} / "
@@ -72,41 +117,63 @@ class RfSMOTE(Logger):
         )
         self.log("op", "SMOTE process started")
 
-        y_train_arr = self.y_train[self.target_name].to_numpy().astype(int)
-
-        self.log("op", "Running SMOTE.fit_resample")
-        self.X_smote, self.y_smote = self.smote.fit_resample(self.X_train, y_train_arr)
-        self.y_smote = DataFrame(self.y_smote, columns=[self.target_name])
+        min_idx = np.flatnonzero(self.train_buffer.y == self.min_class_val)
+        if self.smote_generator is None:
+            with self.profiler.span("SmoteGenerator.__init__", len(min_idx)):
+                self.smote_generator = SmoteGenerator(
+                    self.train_buffer.X[min_idx], self.categ_features
+                )
+
+        # Balance the classes ("not majority")
+        n_samples = self.min_maj_count[self.maj_class_val] - len(min_idx)
+        self.log("op", f"Generating {n_samples} synthetic samples")
+        with self.profiler.span("SMOTE.generate", n_samples):
+            X_new = self.smote_generator.generate(
+                np.arange(len(min_idx)), n_samples, self.rng
+            )
 
         self.log("op", "Creating sets: X_synthetic, y_synthetic")
-        self.X_synthetic = self.X_smote.iloc[len(self.X_train) :]
-        self.y_synthetic = self.y_smote.iloc[len(self.y_train) :]
+        self.X_synthetic = DataFrame(
+            X_new, columns=self.train_buffer.columns, copy=False
+        )
+        self.y_synthetic = DataFrame(
+            {self.target_name: np.full(n_samples, self.min_class_val)}
+        )
 
         self.log("op", "Creating sets: synthetic_samples")
         self.synthetic_samples = concat([self.X_synthetic, self.y_synthetic], axis=1)
 
-        self.log("op", "Applying synthetic_samples to: X_train, y_train")
-        self.X_train_resampled = concat(
-            [self.X_train_resampled, self.X_synthetic], ignore_index=1
+        self.log("op", "Applying synthetic_samples to: train_buffer")
+        self.profiler.check_budget(
+            "train_buffer.append",
+            self.train_buffer.growth_bytes(
+                len(self.train_buffer) + len(self.X_synthetic)
+            ),
         )
-        self.y_train_resampled = concat(
-            [self.y_train_resampled, self.y_synthetic], ignore_index=1
+        self.train_buffer.append(
+            self.X_synthetic, self.y_synthetic[self.target_name], iteration=0
         )
 
         # Recalculate
-        self.min_maj_count = Counter(
-            self.y_train_resampled[self.target_name].to_numpy()
-        )
+        self.min_maj_count = Counter(self.train_buffer.y)
 
     def init_stats(self) -> None:
-        self.X_train_resampled = self.X_train.copy()
-        self.y_train_resampled = self.y_train.copy()
+        self.train_buffer.reset()
 
     def save(self, model_name: str) -> None:
         models_path = Path(SAVED_MODELS_PATH)
         models_path.mkdir(exist_ok=True)
         joblib.dump(self.classifier, f"{SAVED_MODELS_PATH}/{model_name}.pkl")
-        self.log("inf", f"Pickle {model_name}.pkl saved at ./{SAVED_MODELS_PATH}")
+        # What the model was trained with: parameters, seeds, config and data hash
+        fingerprint = training_fingerprint(self, {})
+        Path(f"{SAVED_MODELS_PATH}/{model_name}.json").write_text(
+            json.dumps(fingerprint, indent=2, default=json_default)
+        )
+        self.log(
+            "inf",
+            f"Pickle {model_name}.pkl and its training record {model_name}.json "
+            + f"saved at ./{SAVED_MODELS_PATH}",
+        )
 
     def __str__(self) -> str:
         return "Random Forest + SMOTE Model"
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def stratified_sample_indices(
+    labels: np.ndarray, frac: float, rng: np.random.Generator
+) -> np.ndarray:
+    """Samples `int(frac * n)` positions without replacement from every group of
+    `labels` (non-negative integers, e.g. cluster labels) in a single pass.
+
+    Returns the sampled positions grouped by label, in random order within each
+    group.
+    """
+    labels = np.asarray(labels)
+    if len(labels) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    counts = np.bincount(labels)
+    # Small label types let numpy use radix sort for the stable sort below
+    sort_dtype = np.min_scalar_type(len(counts) - 1)
+
+    # Shuffle, then stable-sort by label: groups become contiguous and shuffled
+    order = rng.permutation(len(labels))
+    order = order[np.argsort(labels[order].astype(sort_dtype), kind="stable")]
+
+    starts = np.cumsum(counts) - counts
+    quotas = (frac * counts).astype(np.intp)
+
+    sorted_labels = labels[order]
+    rank_in_group = np.arange(len(order)) - starts[sorted_labels]
+    return order[rank_in_group < quotas[sorted_labels]]
@@ -0,0 +1,149 @@
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.neighbors import NearestNeighbors
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import SMOTE_K_NEIGHBORS, SMOTE_N_JOBS
+
+
+class SmoteGenerator(Logger):
+    """SMOTENC sample generation over a fixed set of minority rows.
+
+    The rows are encoded once the way `imblearn`'s SMOTENC measures distances:
+    continuous features as they are, and every categorical feature one-hot
+    encoded with the median standard deviation of the continuous features,
+    divided by sqrt(2), as the "on" value. `generate` draws synthetic samples
+    from any subset of the rows, with an exact neighbor search (parallel
+    queries) among that subset only. Searching a subset directly is much
+    cheaper than filtering the neighbors of every row down to it, since the
+    subsets of Active SMOTE hold a few percent of the rows.
+
+    Continuous features are interpolated between a row and one of its
+    neighbors; categorical features take the most frequent value among the
+    row's neighbors, ties broken at random, as in SMOTENC.
+    `generate_per_cluster` samples every cluster of a subset in parallel.
+    """
+
+    def __init__(
+        self,
+        X: np.ndarray,
+        categ_features: list[int],
+        k_neighbors: int = SMOTE_K_NEIGHBORS,
+        n_jobs: int | None = SMOTE_N_JOBS,
+    ) -> None:
+        super().__init__()
+        self.X = np.asarray(X)
+        self.categ_features = np.asarray(categ_features, dtype=np.intp)
+        self.cont_features = np.setdiff1d(
+            np.arange(self.X.shape[1]), self.categ_features
+        )
+        self.k_neighbors = k_neighbors
+        self.n_jobs = n_jobs
+
+        self.log("op", f"Encoding {len(self.X)} rows for SMOTE neighbor search")
+        X_cont = self.X[:, self.cont_features].astype(np.float64)
+        self.median_std = float(np.median(X_cont.std(axis=0))) if len(X_cont) else 0.0
+        self.categ_codes = []  # per categorical feature: (categories, codes)
+        encoded = [X_cont]
+        for col in self.categ_features:
+            categories, codes = np.unique(self.X[:, col], return_inverse=True)
+            self.categ_codes.append((categories, codes))
+            one_hot = np.zeros((len(self.X), len(categories)))
+            one_hot[np.arange(len(self.X)), codes] = self.median_std / np.sqrt(2)
+            encoded.append(one_hot)
+        self.encoded = np.hstack(encoded)
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def neighbors(
+        self, rows: np.ndarray, k: int, n_jobs: int | None = None
+    ) -> np.ndarray:
+        """The `k` nearest neighbors of each of `rows` among `rows`, as positions
+        in `rows`
+        """
+        nn = NearestNeighbors(n_neighbors=k + 1, n_jobs=n_jobs or self.n_jobs)
+        nn.fit(self.encoded[rows])
+        return nn.kneighbors(self.encoded[rows], return_distance=False)[:, 1:]
+
+    def generate(
+        self,
+        rows: np.ndarray,
+        n_samples: int,
+        rng: np.random.Generator,
+        n_jobs: int | None = None,
+    ) -> np.ndarray:
+        """Draws `n_samples` synthetic rows from the rows at positions `rows`"""
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) < 2:
+            self.log("err", f"SMOTE needs at least 2 minority samples, got {len(rows)}")
+        k = min(self.k_neighbors, len(rows) - 1)
+        nns = self.neighbors(rows, k, n_jobs)
+
+        picks = rng.integers(0, nns.size, n_samples)
+        base, neighbor_col = np.divmod(picks, k)
+        neighbor = nns[base, neighbor_col]
+        steps = rng.uniform(size=(n_samples, 1))
+
+        X_new = np.empty((n_samples, self.X.shape[1]), dtype=self.X.dtype)
+        X_base = self.X[rows[base]][:, self.cont_features]
+        X_neighbor = self.X[rows[neighbor]][:, self.cont_features]
+        X_new[:, self.cont_features] = X_base + steps * (X_neighbor - X_base)
+
+        # Majority vote of the base row's neighbors for every categorical feature
+        base_neighbors = rows[nns[base]]
+        for col, (categories, codes) in zip(self.categ_features, self.categ_codes):
+            n_categories = len(categories)
+            cells = np.arange(n_samples)[:, None] * n_categories + codes[base_neighbors]
+            votes = np.bincount(cells.ravel(), minlength=n_samples * n_categories)
+            votes = votes.reshape(n_samples, n_categories).astype(np.float64)
+            votes += rng.uniform(0, 0.5, votes.shape)  # random tie breaking
+            X_new[:, col] = categories[votes.argmax(axis=1)]
+        return X_new
+
+    def generate_per_cluster(
+        self,
+        rows: np.ndarray,
+        clusters: np.ndarray,
+        n_samples: int,
+        rng: np.random.Generator,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Draws `n_samples` synthetic rows from every cluster of `rows` in
+        parallel (`n_jobs` threads), with neighbors searched within the cluster.
+
+        Each cluster gets a share of `n_samples` proportional to its size and
+        its own RNG spawned from `rng`. Clusters of a single row cannot be
+        sampled from and get no share. Returns the samples and their cluster.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        labels, sizes = np.unique(clusters, return_counts=True)
+        sizes = np.where(sizes >= 2, sizes, 0)
+        if not sizes.any():
+            self.log("err", "SMOTE needs a cluster of at least 2 minority samples")
+        budgets = proportional_split(n_samples, sizes)
+
+        jobs = [
+            (rows[clusters == label], budget)
+            for label, budget in zip(labels, budgets)
+            if budget > 0
+        ]
+        seeds = np.random.SeedSequence(int(rng.integers(2**63))).spawn(len(jobs))
+
+        self.log("op", f"Generating samples for {len(jobs)} clusters in parallel")
+        samples = Parallel(n_jobs=self.n_jobs, prefer="threads")(
+            delayed(self.generate)(r, budget, np.random.default_rng(seed), n_jobs=1)
+            for (r, budget), seed in zip(jobs, seeds)
+        )
+        sample_clusters = np.repeat(labels[budgets > 0], budgets[budgets > 0])
+        return np.vstack(samples), sample_clusters
+
+
+def proportional_split(total: int, weights: np.ndarray) -> np.ndarray:
+    """Splits `total` into integer parts proportional to `weights` (largest
+    remainder), summing exactly to `total`
+    """
+    shares = total * weights / weights.sum()
+    parts = np.floor(shares).astype(np.intp)
+    leftover = total - parts.sum()
+    parts[np.argsort(parts - shares, kind="stable")[:leftover]] += 1
+    return parts
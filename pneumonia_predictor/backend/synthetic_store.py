@@ -0,0 +1,134 @@
+import shutil
+import weakref
+from collections import Counter
+from contextlib import suppress
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from pneumonia_predictor.backend.data_fetcher import load_data
+from pneumonia_predictor.backend.data_transformer import DataTransformer
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import SYNTHETIC_SPILL_ROWS, SYNTHETIC_STORE_DIR
+
+ITERATION_COL = "iteration"
+CLUSTER_COL = "cluster"
+
+
+class SyntheticSampleStore(Logger):
+    """Append-only columnar table of the synthetic samples of every iteration.
+
+    Each appended batch is kept as one array per column, tagged with the
+    iteration and source cluster of its rows. Batches can be spilled to Parquet
+    (one file per iteration) so long runs do not keep every iteration in memory.
+    Each store spills into its own subfolder of `location`, removed once it is
+    empty and, with any files left, when the store is garbage collected.
+    """
+
+    def __init__(
+        self,
+        columns: list[str],
+        target_name: str,
+        location: str = SYNTHETIC_STORE_DIR,
+        spill_rows: int | None = SYNTHETIC_SPILL_ROWS,
+    ) -> None:
+        super().__init__()
+        self.columns = [*columns, target_name]
+        self.target_name = target_name
+        self.location = f"{location}/{uuid4().hex[:12]}"
+        # Only this store reads its spilled files, so they go with it
+        weakref.finalize(
+            self, shutil.rmtree, Path(self.location).absolute(), ignore_errors=True
+        )
+        self.spill_rows = spill_rows
+        self.transformer = DataTransformer()
+        self.clear()
+
+    def clear(self) -> None:
+        for filename in getattr(self, "spilled", {}).values():
+            Path(f"{self.location}/{filename}.parquet").unlink(missing_ok=True)
+        self.remove_empty_location()
+        self.batches = []  # in-memory batches: (iteration, {column: ndarray})
+        self.spilled = {}  # iteration -> parquet filename
+        self.rows_per_iteration = Counter()
+
+    def append(
+        self, X: DataFrame, y: DataFrame, iteration: int, cluster: np.ndarray
+    ) -> None:
+        batch = {col: X[col].to_numpy() for col in X.columns}
+        batch[self.target_name] = y[self.target_name].to_numpy()
+        batch[ITERATION_COL] = np.full(len(X), iteration, dtype=np.int32)
+        batch[CLUSTER_COL] = np.asarray(cluster, dtype=np.int32)
+        # The iteration is kept beside the batch, which can have no rows
+        self.batches.append((iteration, batch))
+        self.rows_per_iteration[iteration] += len(X)
+
+        in_memory = sum(len(b[ITERATION_COL]) for _, b in self.batches)
+        if self.spill_rows is not None and in_memory > self.spill_rows:
+            self.spill()
+
+    @property
+    def n_rows(self) -> int:
+        return sum(self.rows_per_iteration.values())
+
+    @property
+    def iterations(self) -> list[int]:
+        return sorted(self.rows_per_iteration)
+
+    def spill(self) -> None:
+        """Writes the in-memory batches to Parquet and drops them from memory"""
+        for iteration in sorted({iteration for iteration, _ in self.batches}):
+            filename = f"synthetic_iter_{iteration}"
+            self.transformer.save(
+                self.query(iterations=[iteration]), filename, self.location, "parquet"
+            )
+            self.spilled[iteration] = filename
+        self.batches = []
+
+    def query(
+        self,
+        iterations: list[int] | None = None,
+        clusters: list[int] | None = None,
+    ) -> DataFrame:
+        # Spilled files skip the row groups of other clusters
+        filters = None if clusters is None else [(CLUSTER_COL, "in", clusters)]
+        frames = [
+            load_data(filename, "parquet", self.location, filters=filters)
+            for iteration, filename in sorted(self.spilled.items())
+            if iterations is None or iteration in iterations
+        ]
+        frames.extend(
+            DataFrame(batch)
+            for iteration, batch in self.batches
+            if iterations is None or iteration in iterations
+        )
+        if not frames:
+            return DataFrame(columns=[*self.columns, ITERATION_COL, CLUSTER_COL])
+
+        samples = concat(frames, ignore_index=True)
+        if clusters is not None:
+            samples = samples[samples[CLUSTER_COL].isin(clusters)]
+        return samples.reset_index(drop=True)
+
+    def to_frame(self) -> DataFrame:
+        return self.query()
+
+    def rollback(self, iteration: int) -> None:
+        """Removes the samples of `iteration` and of every iteration after it"""
+        self.log("op", f"Rolling back synthetic samples from iteration {iteration}")
+        for spilled_iter in [i for i in self.spilled if i >= iteration]:
+            filename = self.spilled.pop(spilled_iter)
+            Path(f"{self.location}/{filename}.parquet").unlink(missing_ok=True)
+        self.remove_empty_location()
+        self.batches = [(i, b) for i, b in self.batches if i < iteration]
+        for rolled_back in [i for i in self.rows_per_iteration if i >= iteration]:
+            del self.rows_per_iteration[rolled_back]
+
+    def remove_empty_location(self) -> None:
+        with suppress(OSError):  # Missing or still holding spilled files
+            Path(self.location).rmdir()
+
+    def __len__(self) -> int:
+        return self.n_rows
@@ -1,68 +1,273 @@
+import os
+import time
 from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import get_context
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
 
+import numpy as np
 import pandas as pd
+from scipy.stats import t as t_dist
 from scipy.stats import ttest_rel
+from threadpoolctl import threadpool_limits
 
 from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import (
+    TESTER_ALPHA,
+    TESTER_MAX_TESTS,
+    TESTER_MIN_TESTS,
+    TESTER_N_JOBS,
+    TESTER_PRACTICAL_BOUND,
+    TESTER_SHARED_DIR,
+)
+
+
+def share_frame(frame: pd.DataFrame, location: str) -> dict:
+    """Writes `frame` as a `.npy` file that workers memory-map instead of
+    receiving a pickled copy
+    """
+    path = Path(location) / f"{uuid4().hex[:12]}.npy"
+    # One float array for any mix of numeric and nullable dtypes, so it can be
+    # memory-mapped (object arrays cannot); the dtypes are restored on load
+    np.save(path, frame.to_numpy(dtype=np.float64, na_value=np.nan))
+    return {
+        "path": str(path),
+        "columns": list(frame.columns),
+        "dtypes": frame.dtypes.to_dict(),
+    }
+
+
+def load_shared_frame(shared: dict) -> pd.DataFrame:
+    values = np.load(shared["path"], mmap_mode="r")
+    frame = pd.DataFrame(values, columns=shared["columns"], copy=False)
+    return frame.astype(shared["dtypes"])
+
+
+def run_trial(
+    model_cls, params: dict, data: list, seed: int, avg: str
+) -> tuple[list[float], float]:
+    """Trains a fresh `model_cls` seeded with `seed`. Returns its overall
+    accuracy, precision, recall and F1-score (`avg` is the averaged report) and
+    the CPU time the trial took.
+    """
+    start = time.process_time()
+    frames = [load_shared_frame(d) if isinstance(d, dict) else d for d in data]
+    model = model_cls(*frames, **{**params, "random_state": seed})
+    model.train()
+    report = getattr(model, avg)
+    res = [
+        model.overall_accuracy,
+        report["precision"],
+        report["recall"],
+        report["f1-score"],
+    ]
+    return res, time.process_time() - start
+
+
+def limit_worker_threads() -> None:
+    # One trial per core: keep BLAS/OpenMP (e.g. k-means) from oversubscribing
+    threadpool_limits(1)
 
 
 class ModelTester(Logger):
+    """Compares two models over repeated training trials.
+
+    Every trial trains fresh copies of both models (built from their `params`),
+    seeded with their `random_state` plus the trial number, so the results do
+    not depend on `n_jobs` and the given models are left untouched.
+    """
+
     def __init__(self, model_a, model_b) -> None:
         super().__init__()
         self.model_a = model_a
         self.model_b = model_b
         self.metrics = ["accuracy", "precision", "recall", "f1-score"]
+        # Model A reports a weighted average, model B a macro average
+        self.averages = {"a": "overall_weighted_avg", "b": "overall_macro_avg"}
+
+    def run_tests(self, num_tests: int, n_jobs: int | None = TESTER_N_JOBS) -> None:
+        self.init_results()
+        with self.trial_runner(n_jobs) as run:
+            self.record_tests(run(range(num_tests)))
+        self.generate_final_res()
+
+    def run_adaptive_tests(
+        self,
+        max_tests: int = TESTER_MAX_TESTS,
+        n_jobs: int | None = TESTER_N_JOBS,
+        alpha: float = TESTER_ALPHA,
+        practical_bound: float = TESTER_PRACTICAL_BOUND,
+        min_tests: int = TESTER_MIN_TESTS,
+    ) -> None:
+        """Runs trials until every metric is settled, or `max_tests` trials.
+
+        After each round of trials (one per worker), the paired differences
+        (B - A) of every metric get a t confidence interval. A metric is settled
+        once its interval excludes zero (`different`) or lies within
+        +-`practical_bound` (`negligible`). Each look uses `alpha / max_tests`
+        (Bonferroni over the looks) so stopping early keeps the overall error
+        rate at `alpha`.
+        """
+        self.init_results()
+        round_size = 1 if n_jobs == 1 else n_jobs or os.cpu_count()
+        with self.trial_runner(n_jobs) as run:
+            n_tests = 0
+            while n_tests < max_tests:
+                tests = range(n_tests, min(n_tests + round_size, max_tests))
+                self.record_tests(run(tests))
+                n_tests = tests.stop
 
-    def run_tests(self, num_tests: int) -> None:
-        self.a_tests_arr = []  # acc, prec, rec, f1
+                if n_tests < max(min_tests, 2):
+                    continue
+                self.sequential_res = self.get_sequential_res(
+                    alpha / max_tests, practical_bound
+                )
+                if (self.sequential_res["Decision"] != "undecided").all():
+                    break
+
+        self.trials_run = n_tests
+        self.trials_saved = max_tests - n_tests
+        self.cpu_time_saved = self.trials_saved * float(np.mean(self.cpu_times))
+        self.log(
+            "inf",
+            f"Stopped after {n_tests} of {max_tests} tests "
+            + f"(~{self.cpu_time_saved:.1f}s of CPU time saved)",
+        )
+        self.generate_final_res()
+
+    def get_sequential_res(self, alpha: float, practical_bound: float) -> pd.DataFrame:
+        rows = []
+        for m in self.metrics:
+            diffs = np.subtract(self.b_tests_per_metric[m], self.a_tests_per_metric[m])
+            mean = diffs.mean()
+            half_width = t_dist.ppf(1 - alpha / 2, len(diffs) - 1) * (
+                diffs.std(ddof=1) / np.sqrt(len(diffs))
+            )
+            low, high = mean - half_width, mean + half_width
+            if -practical_bound < low and high < practical_bound:
+                decision = "negligible"
+            elif low > 0 or high < 0:
+                decision = "different"
+            else:
+                decision = "undecided"
+            rows.append([m, mean, low, high, decision])
+        return pd.DataFrame(
+            rows,
+            columns=["Metrics", "Mean difference", "CI low", "CI high", "Decision"],
+        )
+
+    def init_results(self) -> None:
+        self.a_tests_arr = []  # test, acc, prec, rec, f1
         self.b_tests_arr = []
         self.a_tests_per_metric = defaultdict(list)
         self.b_tests_per_metric = defaultdict(list)
+        self.cpu_times = []  # CPU seconds of each test (both models)
 
-        for t in range(num_tests):
-            # Reset stats of both models
-            self.model_b.X_train_resampled = self.model_b.X_train.copy()
-            self.model_b.y_train_resampled = self.model_b.y_train.copy()
+    def record_tests(self, results: dict) -> None:
+        for t in sorted({n_test for n_test, _ in results}):
+            (a_res, a_cpu), (b_res, b_cpu) = results[(t, "a")], results[(t, "b")]
+            self.a_tests_arr.append([t + 1, *a_res])
+            self.b_tests_arr.append([t + 1, *b_res])
+            self.store_res_per_metric(a_res, b_res)
+            self.cpu_times.append(a_cpu + b_cpu)
 
-            self.log("sep", "=")
-            self.log("inf", f"STARTING TEST {t + 1}")
+    def trial_args(self, n_test: int, model: str, data: list) -> tuple:
+        model_class = self.model_a if model == "a" else self.model_b
+        return (
+            type(model_class),
+            model_class.params,
+            data,
+            model_class.params["random_state"] + n_test,
+            self.averages[model],
+        )
 
-            self.log("op", f"Training Started: {str(self.model_a)}")
-            self.model_a.train()
-            self.a_tests_arr.append(self.parse_res_per_test(self.model_a, t, "a"))
+    @contextmanager
+    def trial_runner(self, n_jobs: int | None) -> Iterator:
+        """Yields a function that runs both models' trials for the given tests,
+        in this process (`n_jobs=1`) or in a process pool kept open meanwhile
+        """
+        if n_jobs == 1:
+            yield self.run_serial
+            return
 
-            self.log("inf", f"Training Started: {str(self.model_b)}")
-            self.model_b.train()
-            self.b_tests_arr.append(self.parse_res_per_test(self.model_b, t, "b"))
+        for model in ["a", "b"]:
+            for frame in self.model_frames(model):
+                non_numeric = [
+                    col
+                    for col, dtype in frame.dtypes.items()
+                    if not pd.api.types.is_numeric_dtype(dtype)
+                ]
+                if non_numeric:
+                    self.log(
+                        "err",
+                        f"Model {model.upper()} has non-numeric columns {non_numeric}, "
+                        + "which cannot be shared with workers: use n_jobs=1",
+                    )
 
-            self.store_res_per_metric()
+        with (
+            TemporaryDirectory(dir=TESTER_SHARED_DIR) as location,
+            ProcessPoolExecutor(
+                n_jobs, get_context("spawn"), initializer=limit_worker_threads
+            ) as pool,
+        ):
+            # Frames stay referenced so their ids are not reused meanwhile
+            frames = {model: self.model_frames(model) for model in ["a", "b"]}
+            shared = {}  # id(frame) -> shared file, for frames both models use
+            for frame in [*frames["a"], *frames["b"]]:
+                if id(frame) not in shared:
+                    shared[id(frame)] = share_frame(frame, location)
+            data = {
+                model: [shared[id(frame)] for frame in frames[model]]
+                for model in ["a", "b"]
+            }
+            yield lambda tests: self.run_parallel(pool, data, tests)
 
-        self.generate_final_res()
+    def run_serial(self, tests: range) -> dict:
+        results = {}
+        for n_test in tests:
+            for model in ["a", "b"]:
+                self.log("inf", f"TEST {n_test + 1}: training model {model.upper()}")
+                results[(n_test, model)] = run_trial(
+                    *self.trial_args(n_test, model, self.model_frames(model))
+                )
+        return results
 
-    def parse_res_per_test(self, model_class, n_test: int, model: str) -> list[float]:
-        avg = (
-            model_class.overall_weighted_avg
-            if model == "a"
-            else model_class.overall_macro_avg
+    def run_parallel(self, pool: ProcessPoolExecutor, data: dict, tests: range) -> dict:
+        self.log(
+            "op", f"Running tests {tests.start + 1}-{tests.stop} in a process pool"
         )
-        test_res_arr = [
-            n_test + 1,
-            model_class.overall_accuracy,
-            avg["precision"],
-            avg["recall"],
-            avg["f1-score"],
+        futures = {
+            pool.submit(run_trial, *self.trial_args(n_test, model, data[model])): (
+                n_test,
+                model,
+            )
+            for n_test in tests
+            for model in ["a", "b"]
+        }
+        results = {}
+        for future in as_completed(futures):
+            n_test, model = futures[future]
+            results[(n_test, model)] = future.result()
+            self.log("inf", f"TEST {n_test + 1}: model {model.upper()} done")
+        return results
+
+    def model_frames(self, model: str) -> list[pd.DataFrame]:
+        model_class = self.model_a if model == "a" else self.model_b
+        return [
+            model_class.X_train,
+            model_class.y_train,
+            model_class.X_test,
+            model_class.y_test,
         ]
-        return test_res_arr
 
-    def store_res_per_metric(self) -> None:
-        for m in self.metrics:
-            if m == "accuracy":
-                self.a_tests_per_metric[m].append(self.model_a.overall_accuracy)
-                self.b_tests_per_metric[m].append(self.model_b.overall_accuracy)
-            else:
-                self.a_tests_per_metric[m].append(self.model_a.overall_weighted_avg[m])
-                self.b_tests_per_metric[m].append(self.model_b.overall_macro_avg[m])
+    def store_res_per_metric(self, a_res: list[float], b_res: list[float]) -> None:
+        for m, a_value, b_value in zip(self.metrics, a_res, b_res):
+            self.a_tests_per_metric[m].append(a_value)
+            self.b_tests_per_metric[m].append(b_value)
 
     def generate_final_res(self) -> None:
         self.model_a_res = pd.DataFrame(
@@ -0,0 +1,127 @@
+import numpy as np
+from pandas import DataFrame, Series
+
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.config import BUFFER_GROWTH_FACTOR, TRAINING_DTYPE
+
+ORIGINAL_ROW = -1  # Iteration index of the rows from the original training set
+
+
+class TrainingBuffer(Logger):
+    """Growable NumPy storage for the resampled training set.
+
+    The original rows come first, followed by the synthetic rows in the order
+    they were appended. Appends are amortized by growing the capacity
+    geometrically, and `X_frame`/`y_frame` wrap read-only views of the filled rows
+    without copying them. Features are stored as `float32` by default, the dtype the
+    forest's trees are fitted on, so fitting does not copy the matrix.
+    """
+
+    def __init__(
+        self,
+        X: DataFrame,
+        y: DataFrame,
+        target_name: str,
+        dtype: np.dtype = TRAINING_DTYPE,
+        growth_factor: float = BUFFER_GROWTH_FACTOR,
+    ) -> None:
+        super().__init__()
+        self.columns = list(X.columns)
+        self.target_name = target_name
+        self.growth_factor = growth_factor
+        self.n_original = len(X)
+        self.n_rows = 0
+
+        self._X = np.empty((self.n_original, len(self.columns)), dtype=dtype)
+        self._y = np.empty(self.n_original, dtype=np.float64)
+        self._iteration = np.empty(self.n_original, dtype=np.int32)
+        self.append(X, y[target_name], ORIGINAL_ROW)
+
+    @property
+    def X(self) -> np.ndarray:
+        return read_only(self._X[: self.n_rows])
+
+    @property
+    def y(self) -> np.ndarray:
+        return read_only(self._y[: self.n_rows])
+
+    @property
+    def iteration(self) -> np.ndarray:
+        """Iteration that produced each row (`ORIGINAL_ROW` for original rows)"""
+        return read_only(self._iteration[: self.n_rows])
+
+    @property
+    def capacity(self) -> int:
+        return len(self._X)
+
+    def X_frame(self) -> DataFrame:
+        return DataFrame(self.X, columns=self.columns, copy=False)
+
+    def y_frame(self) -> DataFrame:
+        return DataFrame({self.target_name: self.y}, copy=False)
+
+    def append(
+        self,
+        X: DataFrame | np.ndarray,
+        y: DataFrame | Series | np.ndarray,
+        iteration: int,
+    ) -> None:
+        n_new = len(X)
+        self.reserve(self.n_rows + n_new)
+
+        if isinstance(X, DataFrame):
+            X = X.to_numpy(dtype=self._X.dtype, na_value=np.nan)
+        if isinstance(y, (DataFrame, Series)):
+            y = y.to_numpy(dtype=np.float64, na_value=np.nan)
+
+        end = self.n_rows + n_new
+        self._X[self.n_rows : end] = X
+        self._y[self.n_rows : end] = np.ravel(y)
+        self._iteration[self.n_rows : end] = iteration
+        self.n_rows = end
+
+    def new_capacity(self, n_rows: int) -> int:
+        if n_rows <= self.capacity:
+            return self.capacity
+        return max(n_rows, int(self.capacity * self.growth_factor))
+
+    def growth_bytes(self, n_rows: int) -> int:
+        """Bytes `reserve(n_rows)` would allocate (0 if it fits already)"""
+        if n_rows <= self.capacity:
+            return 0
+        row_bytes = self._X.itemsize * self._X.shape[1] + self._y.itemsize + 4
+        return self.new_capacity(n_rows) * row_bytes
+
+    def reserve(self, n_rows: int) -> None:
+        if n_rows <= self.capacity:
+            return
+        new_capacity = self.new_capacity(n_rows)
+        self.log("op", f"Growing training buffer: {self.capacity} -> {new_capacity}")
+        for name in ["_X", "_y", "_iteration"]:
+            old = getattr(self, name)
+            new = np.empty((new_capacity, *old.shape[1:]), dtype=old.dtype)
+            new[: self.n_rows] = old[: self.n_rows]
+            setattr(self, name, new)
+
+    def truncate(self, n_rows: int) -> None:
+        self.n_rows = max(self.n_original, min(n_rows, self.n_rows))
+
+    def rollback(self, iteration: int) -> None:
+        """Drops the synthetic rows of `iteration` and of every later iteration"""
+        synthetic_iterations = self.iteration[self.n_original :]
+        self.truncate(
+            self.n_original + int(np.count_nonzero(synthetic_iterations < iteration))
+        )
+
+    def reset(self) -> None:
+        """Drops every synthetic row, keeping the allocated capacity"""
+        self.truncate(self.n_original)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+
+def read_only(view: np.ndarray) -> np.ndarray:
+    """Rows are only written through `append`, never through a returned view"""
+    view.flags.writeable = False
+    return view
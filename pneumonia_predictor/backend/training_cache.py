@@ -0,0 +1,159 @@
+import hashlib
+import inspect
+import json
+import os
+import platform
+from pathlib import Path
+from uuid import uuid4
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from pneumonia_predictor.backend.active_smote import ActiveSMOTE
+from pneumonia_predictor.backend.clustering import Clusterer
+from pneumonia_predictor.backend.logger import Logger
+from pneumonia_predictor.backend.smote_generator import SmoteGenerator
+from pneumonia_predictor.backend.training_buffer import TrainingBuffer
+from pneumonia_predictor.config import TRAINING_CACHE_DIR, TRAINING_CACHE_MAX_MB
+
+CACHE_FORMAT = 2  # Bump when the cached attributes or the key change
+# Config values the models use besides their constructor and `train` arguments,
+# as (function, argument) whose default was bound to the value on import
+TRAINING_SETTINGS = {
+    "DIVERSITY_SAMPLE_FRAC": (ActiveSMOTE.stratified_sampling, "sample_frac"),
+    "UNCERTAINTY_SAMPLE_FRAC": (ActiveSMOTE.uncertainty_sampling, "min_sample_frac"),
+    "SMOTE_K_NEIGHBORS": (SmoteGenerator.__init__, "k_neighbors"),
+    "MINIBATCH_SIZE": (Clusterer.__init__, "batch_size"),
+    "TRAINING_DTYPE": (TrainingBuffer.__init__, "dtype"),
+}
+
+
+def hash_frame(digest: "hashlib._Hash", frame: pd.DataFrame | pd.Series) -> None:
+    frame = frame.to_frame() if isinstance(frame, pd.Series) else frame
+    digest.update(json.dumps([[str(c), str(frame[c].dtype)] for c in frame]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().data)
+
+
+def training_fingerprint(model, train_kwargs: dict) -> dict:
+    """Everything a training run of `model` depends on: its class and
+    constructor arguments (seeds included), the `train` arguments (defaults
+    included), the config values it uses, the library versions and a hash of
+    its data.
+
+    The config values are read from the default arguments they were bound to
+    when the models were imported: changing `config` afterwards changes
+    neither the run nor its key.
+    """
+    # `train()` and `train(n_iterations=N_ITERATIONS)` are the same run
+    train_args = inspect.signature(model.train).bind(**train_kwargs)
+    train_args.apply_defaults()
+
+    data = hashlib.sha256()
+    buffer = model.train_buffer
+    X_train = np.ascontiguousarray(buffer.X[: buffer.n_original])
+    y_train = np.ascontiguousarray(buffer.y[: buffer.n_original])
+    digest_input = [X_train.dtype.str, X_train.shape, buffer.columns]
+    data.update(json.dumps(digest_input).encode())
+    data.update(X_train.data)
+    data.update(y_train.data)
+    hash_frame(data, model.X_test)
+    hash_frame(data, model.y_test)
+
+    return {
+        "format": CACHE_FORMAT,
+        "model": type(model).__name__,
+        "params": model.params,
+        "train": train_args.arguments,
+        "settings": {
+            name: inspect.signature(func).parameters[arg].default
+            for name, (func, arg) in TRAINING_SETTINGS.items()
+        },
+        "versions": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+        },
+        "data_sha256": data.hexdigest(),
+    }
+
+
+def json_default(value):
+    # NumPy scalars hash like the Python numbers they equal
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def fingerprint_key(fingerprint: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True, default=json_default).encode()
+    ).hexdigest()
+
+
+class TrainingCache(Logger):
+    """Memoizes `RfSMOTE.train` and `RfActiveSMOTE.train`.
+
+    A run is keyed by the SHA-256 of its `training_fingerprint`. Since every
+    random step of the models (forest, k-means, stratified sampling and SMOTE
+    generation) is seeded from their `random_state`, equal keys mean equal
+    results, and a hit restores the model's `cached_attrs` (the fitted forest
+    and the statistics) instead of training. The resampled training set is
+    not cached.
+
+    Entries are stored as `<key>.pkl` with a `<key>.json` copy of the
+    fingerprint, and the least recently used ones are evicted once the cache
+    grows past `max_mb`.
+    """
+
+    def __init__(
+        self, location: str = TRAINING_CACHE_DIR, max_mb: float = TRAINING_CACHE_MAX_MB
+    ) -> None:
+        super().__init__()
+        self.location = Path(location)
+        self.max_bytes = max_mb * 1024**2
+        self.location.mkdir(parents=True, exist_ok=True)
+
+    def train(self, model, **train_kwargs) -> bool:
+        """Trains `model` (`train_kwargs` are passed to its `train`) unless an
+        identical run is cached, and returns whether it was
+        """
+        fingerprint = training_fingerprint(model, train_kwargs)
+        key = fingerprint_key(fingerprint)
+        path = self.location / f"{key}.pkl"
+        if path.is_file():
+            self.log("inf", f"Training cache hit: {model} ({key[:12]})")
+            for attr, value in joblib.load(path).items():
+                setattr(model, attr, value)
+            os.utime(path)  # Most recently used
+            return True
+
+        self.log("inf", f"Training cache miss: {model} ({key[:12]})")
+        model.train(**train_kwargs)
+        self.store(key, {attr: getattr(model, attr) for attr in model.cached_attrs})
+        (self.location / f"{key}.json").write_text(
+            json.dumps(fingerprint, indent=2, default=json_default)
+        )
+        self.evict()
+        return False
+
+    def store(self, key: str, state: dict) -> None:
+        tmp = self.location / f".{key}.{uuid4().hex}.tmp"
+        joblib.dump(state, tmp)
+        os.replace(tmp, self.location / f"{key}.pkl")
+
+    def evict(self) -> None:
+        entries = sorted(self.location.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        # The newest entry is kept even if it alone is over the limit
+        for path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            self.log("op", f"Evicting training cache entry: {path.stem[:12]}")
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for path in [*self.location.glob("*.pkl"), *self.location.glob("*.json")]:
+            path.unlink(missing_ok=True)
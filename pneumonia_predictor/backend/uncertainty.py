@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def least_confidence(probabilities: np.ndarray) -> np.ndarray:
+    return 1 - probabilities.max(axis=1)
+
+
+def margin(probabilities: np.ndarray) -> np.ndarray:
+    """One minus the gap between the two most probable classes"""
+    top_two = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return 1 - (top_two[:, 1] - top_two[:, 0])
+
+
+def entropy(probabilities: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = probabilities * np.log(probabilities)
+    return -np.nansum(np.where(probabilities > 0, terms, 0.0), axis=1)
+
+
+UNCERTAINTY_MEASURES = {
+    "least_confidence": least_confidence,
+    "margin": margin,
+    "entropy": entropy,
+}
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the `k` highest scores (unordered), found with an O(n)
+    partition instead of a full sort. NaN scores are never preferred.
+    """
+    k = min(max(k, 0), len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    scores = np.nan_to_num(scores, nan=-np.inf)
+    return np.argpartition(-scores, k - 1)[:k]
@@ -1,7 +1,10 @@
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 from pandas import DataFrame
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import classification_report
 
 
 def get_feature_target_set(
@@ -13,6 +16,22 @@ def get_feature_target_set(
     return X, y
 
 
+def oob_classification_report(
+    classifier: RandomForestClassifier, y_true: np.ndarray
+) -> dict:
+    """`classification_report` of the forest's out-of-bag predictions for the first
+    `len(y_true)` training rows. Rows that were in every tree's bootstrap have no
+    OOB prediction and are left out.
+    """
+    y_true = np.ravel(y_true)
+    oob_proba = classifier.oob_decision_function_[: len(y_true)]
+    has_oob = ~np.isnan(oob_proba).any(axis=1)
+    y_pred = classifier.classes_.take(oob_proba[has_oob].argmax(axis=1))
+    return classification_report(
+        y_true[has_oob], y_pred, labels=classifier.classes_, output_dict=True
+    )
+
+
 def save_figure(fig_id: str, fig_ext: str = "png", resolution: int = 300) -> None:
     images_dir = Path() / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,80 @@
+import argparse
+
+from pneumonia_predictor.config import (
+    SAVED_MODELS,
+    SCORING_CHUNK_SIZE,
+    SERVER_BATCH_WAIT_MS,
+    SERVER_HOST,
+    SERVER_MAX_BATCH_SIZE,
+    SERVER_PORT,
+)
+
+
+def score(args: argparse.Namespace) -> None:
+    from pneumonia_predictor.backend.batch_scorer import BatchScorer
+
+    scorer = BatchScorer(args.model, args.chunk_size)
+    scorer.score(args.input, args.output)
+    print(
+        f"Scored {scorer.n_rows} rows in {scorer.elapsed:.2f}s "
+        + f"({scorer.rows_per_sec:.0f} rows/sec) -> {args.output}"
+    )
+
+
+def serve(args: argparse.Namespace) -> None:
+    from pneumonia_predictor.backend.inference_server import InferenceServer
+
+    server = InferenceServer(
+        args.host, args.port, args.max_batch_size, args.batch_wait_ms
+    )
+    print(f"Serving {', '.join(server.models)} on http://{args.host}:{args.port}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        print("Server stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="pneumonia_predictor")
+    subparsers = parser.add_subparsers(required=True)
+
+    score_parser = subparsers.add_parser(
+        "score", help="score a CSV/Parquet dataset in chunks"
+    )
+    score_parser.add_argument("input", help="dataset to score (.csv or .parquet)")
+    score_parser.add_argument("output", help="destination (.csv or .parquet)")
+    score_parser.add_argument(
+        "--model",
+        default="RfActiveSMOTE",
+        help=f"one of {', '.join(SAVED_MODELS)} or a saved model name",
+    )
+    score_parser.add_argument(
+        "--chunk-size", type=int, default=SCORING_CHUNK_SIZE, help="rows per chunk"
+    )
+    score_parser.set_defaults(func=score)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="start the HTTP inference server"
+    )
+    serve_parser.add_argument("--host", default=SERVER_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    serve_parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=SERVER_MAX_BATCH_SIZE,
+        help="rows per micro-batch",
+    )
+    serve_parser.add_argument(
+        "--batch-wait-ms",
+        type=float,
+        default=SERVER_BATCH_WAIT_MS,
+        help="how long a micro-batch waits for more requests",
+    )
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,117 @@
 HTML_FILES_DIR = "pneumonia_predictor/frontend/html"
 DATASET_DIR = "datasets"
+DATASET_COMPRESSION = None  # Parquet/Feather codec (None: snappy / uncompressed)
+PARQUET_ROW_GROUP_SIZE = None  # Rows per row group or record batch (None: default)
+DOWNLOAD_CACHE_DIR = f"{DATASET_DIR}/.download_cache"  # Content-addressed downloads
+DOWNLOAD_CHUNK_SIZE = 1024**2  # Bytes read and written at a time
+DOWNLOAD_TIMEOUT = 30  # Seconds without data before a download attempt fails
+DOWNLOAD_RETRIES = 3  # Resumed attempts after an interrupted download
 LOGS_ENABLED = True
 LOGFILE_ENABLED = True
 LOGFILE_LOC = "logs.txt"
+LOG_LEVEL = "op"  # Lowest level written: "op" (everything), "inf" or "err"
+LOG_FLUSH_INTERVAL = 0.5  # Seconds the log writer batches records before writing
 SAVED_MODELS_PATH = "saved_models"
+SAVED_MODELS = {  # Models served by the app, the batch scorer and the server
+    "RfSMOTE": "pneumonia_predictor_rfsmote",
+    "RfActiveSMOTE": "pneumonia_predictor",
+}
+
+# Dataset schema
+TARGET_NAME = "pneumonia"
+FEATURE_COLUMNS = [
+    "age",
+    "sex",
+    "fatigue",
+    "cough_phlegm",
+    "chronic_resp_disease",
+    "chronic_kidney_disease",
+    "heart_failure",
+    "cancer",
+    "systoic_bp",
+    "dias_bp",
+    "pulse_rate",
+    "resp_rate",
+    "diabetes_mellitus",
+    "hemoglobin",
+    "platelets",
+    "cough",
+    "temp",
+    "hematocrit",
+    "rbc",
+    "wbc",
+]
+CATEG_FEATURES = [3, 4, 5, 6, 7, 12, 15]  # Positions in FEATURE_COLUMNS
+FEATURE_SCHEMA = {  # Compact dtypes applied by DataTransformer.apply_schema
+    "age": "uint8",
+    "sex": "uint8",
+    "fatigue": "uint8",
+    "cough_phlegm": "uint8",
+    "chronic_resp_disease": "uint8",
+    "chronic_kidney_disease": "uint8",
+    "heart_failure": "uint8",
+    "cancer": "uint8",
+    "systoic_bp": "uint16",
+    "dias_bp": "uint8",
+    "pulse_rate": "uint16",
+    "resp_rate": "uint8",
+    "diabetes_mellitus": "uint8",
+    "hemoglobin": "float32",
+    "platelets": "float32",
+    "cough": "uint8",
+    "temp": "float32",
+    "hematocrit": "float32",
+    "rbc": "float32",
+    "wbc": "float32",
+}
 
 # Hyperparameters
+RANDOM_STATE = 42
 SAMPLING_RATIO = 0.25
 N_CLUSTERS = 4
+CLUSTERING_BACKEND = "kmeans"  # "kmeans" (full batch) or "minibatch"
+CLUSTER_WARM_START = False  # Start each clustering from the previous centroids
+MINIBATCH_SIZE = 4096  # Batch size of the "minibatch" clustering backend
+DIVERSITY_SAMPLE_FRAC = 0.20  # Fraction of each cluster kept by diversity sampling
+UNCERTAINTY_SAMPLE_FRAC = 0.25  # Fraction of minority rows kept as most uncertain
+UNCERTAINTY_MEASURE = "least_confidence"  # "least_confidence", "margin", "entropy"
+PROBABILITY_SOURCE = "oob"  # "oob" (out-of-bag estimates) or "predict"
+SMOTE_K_NEIGHBORS = 5  # Neighbors each synthetic sample interpolates from
+SMOTE_N_JOBS = -1  # Parallel neighbor queries (-1: all CPUs)
+SMOTE_PER_CLUSTER = False  # Generate per cluster in parallel, neighbors within cluster
 N_ITERATIONS = 5  # For model retraining
 N_ESTIMATORS = 100  # For random forest
+TREES_PER_ITERATION = None  # Trees regrown per retrain (None: refit whole forest)
+
+# Training
+EVALUATION_MODE = "holdout"  # "holdout" (test set every iteration) or "oob"
+TRAINING_DTYPE = "float32"  # Training matrix dtype (what the forest's trees use)
+BUFFER_GROWTH_FACTOR = 2.0  # Capacity multiplier when the training buffer is full
+SYNTHETIC_STORE_DIR = f"{DATASET_DIR}/synthetic"  # Spilled synthetic samples
+SYNTHETIC_SPILL_ROWS = None  # Spill to Parquet above this many rows (None: never)
+TRAINING_CACHE_DIR = f"{SAVED_MODELS_PATH}/.training_cache"  # See training_cache.py
+TRAINING_CACHE_MAX_MB = 2048  # Least recently used runs are evicted above this
+
+# Profiling
+PROFILING_ENABLED = False  # Time the training stages (see backend/profiler.py)
+MEMORY_PROFILING_ENABLED = False  # Record RSS and tracemalloc peaks per stage
+MEMORY_BUDGET_MB = None  # Stop training above this RSS (None: no limit)
+
+# Model testing
+TESTER_N_JOBS = 1  # Worker processes for test trials (1: serial, None: all CPUs)
+TESTER_SHARED_DIR = None  # Where the shared data arrays are written (None: tmp)
+TESTER_MAX_TESTS = 30  # Trial cap of adaptive testing
+TESTER_MIN_TESTS = 3  # Trials before adaptive testing may stop
+TESTER_ALPHA = 0.05  # Overall significance level of adaptive testing
+TESTER_PRACTICAL_BOUND = 0.01  # Metric differences below this are negligible
+
+# Inference
+INFERENCE_VECTORIZED_ROWS = 2_000  # Larger batches are scored tree by tree
+SCORING_CHUNK_SIZE = 50_000  # Rows per chunk for batch scoring
+
+# Inference server
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_MAX_BATCH_SIZE = 256  # Rows per micro-batch
+SERVER_BATCH_WAIT_MS = 5  # How long a micro-batch waits for more requests
+SERVER_METRICS_WINDOW = 10_000  # Recent requests used for latency percentiles
@@ -0,0 +1,13 @@
+import pytest
+
+from pneumonia_predictor.backend.logger import flush_all
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Runs every test in its own folder: the log file and the default dataset
+    and model folders are relative to the working directory
+    """
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    flush_all()  # Before the working directory is restored
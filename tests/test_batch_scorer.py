@@ -0,0 +1,44 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.cohort import make_cohort
+from pneumonia_predictor.backend.batch_scorer import BatchScorer
+from pneumonia_predictor.backend.data_fetcher import load_data
+
+
+@pytest.fixture
+def scorer(workdir) -> BatchScorer:
+    X, y = make_cohort(300)
+    classifier = RandomForestClassifier(n_estimators=5, random_state=0)
+    classifier.fit(X, y.to_numpy().ravel())
+    joblib.dump(classifier, workdir / "model.pkl")
+    return BatchScorer("model", chunk_size=100, models_location=str(workdir))
+
+
+@pytest.fixture
+def dataset(workdir) -> pd.DataFrame:
+    X, _ = make_cohort(250, seed=3)
+    # Passthrough columns whose type only shows after the first chunk
+    X["note"] = [None] * 100 + ["seen"] * 150
+    X["visits"] = np.arange(250)
+    X.loc[150, "visits"] = np.nan
+    X.loc[200:, "visits"] += 0.5
+    X.to_csv(workdir / "cohort.csv", index=False)
+    return X
+
+
+@pytest.mark.parametrize("output_type", ["csv", "parquet", "feather"])
+def test_score(scorer, dataset, workdir, output_type):
+    scorer.score(str(workdir / "cohort.csv"), str(workdir / f"scored.{output_type}"))
+
+    scored = load_data("scored", output_type, str(workdir))
+    assert scorer.n_rows == len(scored) == len(dataset)
+    assert list(scored.columns[: len(dataset.columns)]) == list(dataset.columns)
+    assert scored["note"][:100].isna().all()
+    assert (scored["note"][100:] == "seen").all()
+    np.testing.assert_array_equal(scored["visits"], dataset["visits"])
+    probabilities = scored.filter(like="probability_").sum(axis=1)
+    np.testing.assert_allclose(probabilities, 1)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pneumonia_predictor.backend.data_fetcher import iter_data, load_data
+from pneumonia_predictor.backend.data_transformer import DataTransformer
+
+FORMATS = ["csv", "parquet", "feather"]
+
+
+@pytest.fixture
+def dataset() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "x": [1.0, 2.0, np.nan, 3.0, 1.0, np.nan],
+            "group": [1, 2, 1, 2, 1, 2],
+            "age": [30, 45, 52, 61, 27, 80],
+        }
+    )
+
+
+@pytest.fixture
+def saved(dataset, workdir) -> str:
+    for filetype in FORMATS:
+        DataTransformer().save(dataset, "cohort", str(workdir), filetype)
+    return str(workdir)
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        [("x", "!=", 1.0)],
+        [("x", "<", 3.0)],
+        [("x", "in", [1.0, 3.0])],
+        [("x", "not in", [2.0])],
+        [[("x", ">=", 2.0)], [("group", "==", 1)]],
+    ],
+)
+def test_filters_match_across_formats(saved, filters):
+    results = {
+        filetype: load_data("cohort", filetype, saved, filters=filters)
+        for filetype in FORMATS
+    }
+
+    expected = results["parquet"].reset_index(drop=True)
+    assert not expected.empty
+    for filetype in ["csv", "feather"]:
+        pd.testing.assert_frame_equal(
+            results[filetype].reset_index(drop=True), expected, check_dtype=False
+        )
+
+
+@pytest.mark.parametrize("filetype", FORMATS)
+def test_missing_values(saved, filetype):
+    not_one = load_data("cohort", filetype, saved, filters=[("x", "!=", 1.0)])
+    not_in = load_data("cohort", filetype, saved, filters=[("x", "not in", [1.0])])
+
+    assert not_one["age"].tolist() == [45, 61]
+    assert not_in["age"].tolist() == [45, 52, 61, 80]
+
+
+@pytest.mark.parametrize("filetype", FORMATS)
+def test_columns_and_dtypes(saved, filetype):
+    columns = ["age", "x"]
+    dtypes = {"age": "uint8", "x": "float32"}
+
+    loaded = load_data("cohort", filetype, saved, columns=columns, dtypes=dtypes)
+    chunks = list(iter_data("cohort", filetype, saved, 4, columns, dtypes=dtypes))
+
+    assert list(loaded.columns) == columns
+    assert loaded.dtypes.astype(str).to_dict() == dtypes
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), loaded)
+
+
+def test_partitioned_parquet(dataset, workdir):
+    DataTransformer().save(
+        dataset, "partitioned", str(workdir), "parquet", partition_cols=["group"]
+    )
+
+    loaded = load_data("partitioned", "parquet", str(workdir))
+    chunks = list(iter_data("partitioned", "parquet", str(workdir)))
+    filtered = load_data(
+        "partitioned", "parquet", str(workdir), filters=[("group", "==", 2)]
+    )
+
+    # Partition columns come last
+    assert list(loaded.columns) == ["x", "age", "group"]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), loaded)
+    assert loaded.sort_values("age")["group"].tolist() == [1, 1, 2, 1, 2, 2]
+    assert filtered["age"].tolist() == [45, 61, 80]
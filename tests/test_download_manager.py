@@ -0,0 +1,118 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pneumonia_predictor.backend.download_manager import DownloadManager
+
+
+class FileServer(ThreadingHTTPServer):
+    """Serves `content` at every path, honoring Range and If-Range. The first
+    response after `drop_after` is set stops after that many bytes
+    """
+
+    content = b""
+    etag = '"v1"'
+    drop_after = None
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), RangeHandler)
+        self.requests = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/data.csv"
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        server = self.server
+        server.requests.append(dict(self.headers))
+        content, start = server.content, 0
+        range_header, if_range = self.headers.get("Range"), self.headers.get("If-Range")
+        if range_header and if_range in (None, server.etag):
+            start = int(range_header.removeprefix("bytes=").split("-")[0])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+
+        body = content[start:]
+        if server.drop_after is not None:
+            body, server.drop_after = body[: server.drop_after], None
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    server.content = bytes(range(256)) * 400
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager(workdir) -> DownloadManager:
+    return DownloadManager(str(workdir / "cache"), chunk_size=4096, retries=2)
+
+
+def test_fetch_and_cache(server, manager):
+    path = manager.fetch(server.url)
+
+    assert path.read_bytes() == server.content
+    assert path.name == hashlib.sha256(server.content).hexdigest()
+    assert manager.fetch(server.url) == path
+    assert len(server.requests) == 1
+
+
+def test_resume_interrupted_download(server, manager):
+    server.drop_after = 30_000
+
+    path = manager.fetch(server.url)
+
+    assert path.read_bytes() == server.content
+    resumed = server.requests[1]
+    assert resumed["Range"] == "bytes=30000-"
+    assert resumed["If-Range"] == server.etag
+    assert not any((manager.cache_dir / "partial").iterdir())
+
+
+def test_restart_when_file_changed(server, manager):
+    server.drop_after = 30_000
+    with pytest.raises(SystemExit):
+        DownloadManager(str(manager.cache_dir), retries=0).download(server.url)
+
+    server.content = bytes(range(255, -1, -1)) * 400
+    server.etag = '"v2"'
+    path = manager.fetch(server.url)
+
+    assert server.requests[1]["If-Range"] == '"v1"'
+    assert path.read_bytes() == server.content
+
+
+def test_checksum_mismatch(server, manager):
+    with pytest.raises(SystemExit):
+        manager.fetch(server.url, sha256="0" * 64)
+
+    assert not any((manager.cache_dir / "objects").iterdir())
+
+
+def test_materialize(server, manager, workdir):
+    dest = workdir / "datasets" / "data.csv"
+    cached = manager.fetch(server.url)
+
+    assert manager.materialize(cached, dest)
+    assert dest.read_bytes() == server.content
+    assert not manager.materialize(cached, dest)
@@ -0,0 +1,34 @@
+import pytest
+
+from pneumonia_predictor.backend.logger import Logger
+
+
+def test_flush_writes_records(workdir):
+    logger = Logger(logfile_loc=str(workdir / "logs.txt"))
+    logger.log("op", "first")
+    logger.log("inf", "second")
+
+    logger.flush()
+
+    lines = (workdir / "logs.txt").read_text().splitlines()
+    assert lines[0].endswith("[OP]: first.")
+    assert lines[1].endswith("[INFO]: second")
+
+
+def test_missing_log_folder(workdir):
+    logfile = workdir / "missing" / "logs.txt"
+    logger = Logger(logfile_loc=str(logfile))
+    logger.log("op", "kept")
+
+    # The writer thread fails: flush raises instead of waiting for it
+    with pytest.raises(OSError):
+        logger.flush()
+    with pytest.raises(OSError):
+        logger.log("op", "also kept")
+    with pytest.raises(SystemExit):
+        logger.log("err", "failed")
+
+    logger.create_logs_file()
+    logger.log("op", "written")
+    logger.flush()
+    assert logfile.read_text().splitlines()[1].endswith("[OP]: written.")
@@ -0,0 +1,49 @@
+import tracemalloc
+
+import numpy as np
+
+from pneumonia_predictor.backend.profiler import Profiler
+
+
+def profiler() -> Profiler:
+    return Profiler(enabled=True, track_memory=True, memory_budget_mb=None)
+
+
+def test_spans():
+    p = profiler()
+    with p.span("init", rows=10):
+        pass
+    p.start_run()
+    with p.span("fit", rows=100):
+        np.ones(10**6)
+    p.end_run()
+
+    records = p.to_frame()
+    assert records["run"].tolist() == [0, 1]
+    assert np.isnan(records["traced_peak_mb"][0])
+    assert records["traced_peak_mb"][1] >= 7
+    assert sorted(p.summary().index) == ["fit", "init"]
+
+
+def test_profilers_share_tracing():
+    first, second = profiler(), profiler()
+    assert not tracemalloc.is_tracing()
+
+    first.start_run()
+    second.start_run()
+    first.end_run()
+    assert tracemalloc.is_tracing()
+
+    second.end_run()
+    assert not tracemalloc.is_tracing()
+
+
+def test_leaves_other_tracing_alone():
+    tracemalloc.start()
+    try:
+        p = profiler()
+        p.start_run()
+        p.end_run()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
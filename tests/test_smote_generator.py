@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+
+from pneumonia_predictor.backend.smote_generator import (
+    SmoteGenerator,
+    proportional_split,
+)
+
+CATEG_FEATURES = [2, 3]
+
+
+@pytest.fixture
+def generator() -> SmoteGenerator:
+    rng = np.random.default_rng(0)
+    X = np.column_stack(
+        [
+            rng.uniform(0, 10, 200),
+            rng.uniform(-5, 5, 200),
+            rng.integers(0, 2, 200),
+            rng.integers(0, 3, 200),
+        ]
+    )
+    return SmoteGenerator(X, CATEG_FEATURES, k_neighbors=5, n_jobs=1)
+
+
+def test_neighbors_within_subset(generator):
+    rows = np.arange(0, 200, 4)
+
+    nns = generator.neighbors(rows, 5)
+
+    # Without query points, kneighbors leaves each point out of its neighbors
+    nn = NearestNeighbors(n_neighbors=5).fit(generator.encoded[rows])
+    expected = nn.kneighbors(return_distance=False)
+    assert nns.shape == (len(rows), 5)
+    assert (nns != np.arange(len(rows))[:, None]).all()
+    np.testing.assert_array_equal(np.sort(nns, axis=1), np.sort(expected, axis=1))
+
+
+def test_generate_stays_in_subset(generator):
+    rows = np.flatnonzero(generator.X[:, 0] < 5)
+
+    X_new = generator.generate(rows, 300, np.random.default_rng(1))
+
+    assert X_new.shape == (300, 4)
+    assert (X_new[:, 0] >= 0).all() and (X_new[:, 0] < 5).all()
+    cont = generator.X[rows][:, [0, 1]]
+    assert (X_new[:, [0, 1]] >= cont.min(axis=0)).all()
+    assert (X_new[:, [0, 1]] <= cont.max(axis=0)).all()
+    for col in CATEG_FEATURES:
+        assert set(X_new[:, col]) <= set(generator.X[rows, col])
+
+
+def test_generate_is_seeded(generator):
+    rows = np.arange(50)
+
+    first = generator.generate(rows, 20, np.random.default_rng(3))
+    second = generator.generate(rows, 20, np.random.default_rng(3))
+
+    np.testing.assert_array_equal(first, second)
+
+
+def test_generate_small_subsets(generator):
+    X_new = generator.generate(np.array([4, 9]), 10, np.random.default_rng(0))
+    assert X_new.shape == (10, 4)
+
+    with pytest.raises(SystemExit):
+        generator.generate(np.array([4]), 10, np.random.default_rng(0))
+
+
+def test_generate_per_cluster(generator):
+    rows = np.arange(100)
+    clusters = np.repeat([0, 1, 2], [60, 39, 1])
+
+    X_new, sample_clusters = generator.generate_per_cluster(
+        rows, clusters, 50, np.random.default_rng(0)
+    )
+
+    assert X_new.shape == (50, 4)
+    assert np.bincount(sample_clusters).tolist() == [30, 20]
+
+
+def test_proportional_split():
+    parts = proportional_split(10, np.array([1, 1, 1]))
+    assert parts.sum() == 10
+    assert sorted(parts) == [3, 3, 4]
+    assert proportional_split(7, np.array([0, 2, 5])).tolist() == [0, 2, 5]
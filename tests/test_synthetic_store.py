@@ -0,0 +1,122 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pneumonia_predictor.backend.synthetic_store import (
+    CLUSTER_COL,
+    ITERATION_COL,
+    SyntheticSampleStore,
+)
+
+COLUMNS = ["age", "temp"]
+TARGET = "admitted"
+
+
+def batch(n_rows: int, offset: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    values = np.arange(offset, offset + n_rows, dtype=np.float64)
+    X = pd.DataFrame({"age": values, "temp": values / 10})
+    y = pd.DataFrame({TARGET: np.ones(n_rows, dtype=np.int64)})
+    return X, y
+
+
+def fill(store: SyntheticSampleStore, sizes: list[int]) -> None:
+    for iteration, n_rows in enumerate(sizes, start=1):
+        X, y = batch(n_rows, offset=100 * iteration)
+        store.append(X, y, iteration, np.arange(n_rows) % 2)
+
+
+@pytest.mark.parametrize("spill_rows", [None, 0])
+def test_query(spill_rows):
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=spill_rows)
+    fill(store, [3, 4, 5])
+
+    assert len(store) == 12
+    assert store.iterations == [1, 2, 3]
+    assert bool(store.spilled) == (spill_rows is not None)
+
+    samples = store.query(iterations=[2])
+    assert samples["age"].tolist() == [200, 201, 202, 203]
+    assert set(samples[ITERATION_COL]) == {2}
+
+    samples = store.query(clusters=[1])
+    assert len(samples) == 1 + 2 + 2
+    assert set(samples[CLUSTER_COL]) == {1}
+    assert len(store.to_frame()) == 12
+
+
+@pytest.mark.parametrize("spill_rows", [None, 0])
+def test_rollback(spill_rows):
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=spill_rows)
+    fill(store, [3, 4, 5])
+
+    store.rollback(2)
+
+    assert len(store) == 3
+    assert store.iterations == [1]
+    assert store.query()["age"].tolist() == [100, 101, 102]
+    assert sorted(store.spilled) == ([1] if spill_rows is not None else [])
+
+
+def test_spill_keeps_rows():
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=None)
+    fill(store, [3, 4])
+    in_memory = store.to_frame()
+
+    store.spill()
+
+    assert store.batches == []
+    assert sorted(store.spilled) == [1, 2]
+    pd.testing.assert_frame_equal(store.to_frame(), in_memory, check_dtype=False)
+
+
+def test_empty_batches():
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=None)
+    X, y = batch(0)
+    store.append(X, y, 1, np.array([], dtype=np.int32))
+    fill(store, [0, 2])
+
+    assert len(store) == 2
+    assert store.query(iterations=[1]).empty
+
+    store.spill()
+    store.rollback(2)
+
+    assert len(store) == 0
+    assert store.iterations == [1]
+
+
+def test_clear_removes_spilled_files(workdir):
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=0)
+    fill(store, [3])
+    spilled = list(workdir.rglob("*.parquet"))
+    assert spilled
+
+    store.clear()
+
+    assert len(store) == 0
+    assert not any(path.exists() for path in spilled)
+    assert not (workdir / store.location).exists()
+
+
+def test_rollback_removes_empty_folder(workdir):
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=0)
+    fill(store, [3, 4])
+
+    store.rollback(2)
+    assert (workdir / store.location).exists()
+    store.rollback(1)
+    assert not (workdir / store.location).exists()
+
+
+def test_spilled_files_go_with_the_store(workdir):
+    store = SyntheticSampleStore(COLUMNS, TARGET, spill_rows=0)
+    fill(store, [3])
+    location = workdir / store.location
+    assert any(location.iterdir())
+
+    del store
+    gc.collect()
+
+    assert not location.exists()
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from pneumonia_predictor.backend.tester import load_shared_frame, share_frame
+
+
+def test_shared_frame_round_trip(workdir):
+    frame = pd.DataFrame(
+        {
+            "age": pd.array([30, None, 61], dtype="Int64"),
+            "temp": [36.5, np.nan, 39.0],
+            "sex": np.array([1, 0, 1], dtype=np.uint8),
+            "smoker": [True, False, True],
+        }
+    )
+
+    shared = share_frame(frame, str(workdir))
+
+    assert np.load(shared["path"], mmap_mode="r").dtype == np.float64
+    pd.testing.assert_frame_equal(load_shared_frame(shared), frame)
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pytest
+
+import pneumonia_predictor.config as config
+from benchmarks.cohort import make_cohort
+from pneumonia_predictor.backend.rf_active_smote import RfActiveSMOTE
+from pneumonia_predictor.backend.rf_smote import RfSMOTE
+from pneumonia_predictor.backend.training_cache import (
+    TrainingCache,
+    fingerprint_key,
+    training_fingerprint,
+)
+from pneumonia_predictor.config import CATEG_FEATURES, N_ITERATIONS, TARGET_NAME
+
+
+@pytest.fixture(scope="module")
+def cohort():
+    X_train, y_train = make_cohort(400)
+    X_test, y_test = make_cohort(100, seed=7)
+    return X_train, y_train, X_test, y_test
+
+
+def rf_smote(cohort, random_state: int = 0) -> RfSMOTE:
+    return RfSMOTE(
+        *cohort, TARGET_NAME, CATEG_FEATURES, num_est=5, random_state=random_state
+    )
+
+
+def entries(cache: TrainingCache) -> list[str]:
+    return sorted(path.stem for path in cache.location.glob("*.pkl"))
+
+
+def test_hit_restores_results(cohort, workdir):
+    cache = TrainingCache(str(workdir / "cache"))
+    trained = rf_smote(cohort)
+    assert not cache.train(trained)
+
+    restored = rf_smote(cohort)
+    assert cache.train(restored)
+
+    assert restored.overall_accuracy == trained.overall_accuracy
+    np.testing.assert_array_equal(
+        restored.classifier.predict(cohort[2]), trained.classifier.predict(cohort[2])
+    )
+    assert len(entries(cache)) == 1
+    assert len(list(cache.location.glob("*.json"))) == 1
+
+
+def test_miss_on_different_inputs(cohort, workdir):
+    cache = TrainingCache(str(workdir / "cache"))
+    cache.train(rf_smote(cohort))
+
+    assert not cache.train(rf_smote(cohort, random_state=1))
+
+    X_train, y_train, X_test, y_test = cohort
+    other_data = (X_train.iloc[1:], y_train.iloc[1:], X_test, y_test)
+    assert not cache.train(rf_smote(other_data))
+    assert len(entries(cache)) == 3
+
+
+def test_default_train_arguments(cohort):
+    model = RfActiveSMOTE(*cohort, TARGET_NAME, CATEG_FEATURES, num_est=5)
+
+    default = training_fingerprint(model, {})
+    explicit = training_fingerprint(model, {"n_iterations": N_ITERATIONS})
+    numpy_int = training_fingerprint(model, {"n_iterations": np.int64(N_ITERATIONS)})
+    other = training_fingerprint(model, {"n_iterations": N_ITERATIONS + 1})
+
+    assert fingerprint_key(default) == fingerprint_key(explicit)
+    assert fingerprint_key(default) == fingerprint_key(numpy_int)
+    assert fingerprint_key(default) != fingerprint_key(other)
+
+
+def test_settings_used_by_the_models(cohort, monkeypatch):
+    model = RfActiveSMOTE(*cohort, TARGET_NAME, CATEG_FEATURES, num_est=5)
+    fingerprint = training_fingerprint(model, {})
+    sample_frac = config.DIVERSITY_SAMPLE_FRAC
+
+    # The models bound the config values on import: changing them has no effect
+    monkeypatch.setattr(config, "DIVERSITY_SAMPLE_FRAC", sample_frac * 2)
+
+    assert fingerprint["settings"]["DIVERSITY_SAMPLE_FRAC"] == sample_frac
+    assert fingerprint_key(training_fingerprint(model, {})) == fingerprint_key(
+        fingerprint
+    )
+
+
+def test_evicts_least_recently_used(cohort, workdir):
+    cache = TrainingCache(str(workdir / "cache"))
+    for random_state in [0, 1]:
+        cache.train(rf_smote(cohort, random_state))
+    first, second = (
+        fingerprint_key(training_fingerprint(rf_smote(cohort, seed), {}))
+        for seed in [0, 1]
+    )
+    size = max(path.stat().st_size for path in cache.location.glob("*.pkl"))
+    os.utime(cache.location / f"{first}.pkl", (1, 1))
+    os.utime(cache.location / f"{second}.pkl", (2, 2))
+
+    # Using the first entry makes the second one the least recently used
+    cache.max_bytes = 2.5 * size
+    assert cache.train(rf_smote(cohort, 0))
+    cache.train(rf_smote(cohort, 2))
+
+    assert second not in entries(cache)
+    assert first in entries(cache)
+    assert not (cache.location / f"{second}.json").exists()
+    assert len(entries(cache)) == 2
+
+
+def test_keeps_newest_entry_over_limit(cohort, workdir):
+    cache = TrainingCache(str(workdir / "cache"), max_mb=0)
+
+    cache.train(rf_smote(cohort, 0))
+    cache.train(rf_smote(cohort, 1))
+
+    assert len(entries(cache)) == 1
+    cache.clear()
+    assert entries(cache) == []
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pneumonia_predictor.backend.data_transformer import DataTransformer
+
+
+@pytest.fixture
+def transformer() -> DataTransformer:
+    return DataTransformer()
+
+
+@pytest.fixture
+def raw() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": range(6),
+            "sex": ["Male", "Female", "Female", "Male", "Other", "Male"],
+            "smoker": ["yes", "no", "no", "yes", "no", "no"],
+            "temp": [36.5, 38.2, 39.0, 37.1, 36.9, 40.2],
+            "age": [30.0, 45.0, np.nan, 61.0, 27.0, 80.0],
+        },
+        index=[10, 11, 12, 13, 14, 15],
+    )
+
+
+def eager(transformer: DataTransformer, raw: pd.DataFrame) -> pd.DataFrame:
+    dataset = transformer.remove_columns(raw, ["id"])
+    dataset = transformer.map_col_values(
+        dataset, {"sex": {"Male": "m", "Female": "f"}, "smoker": {"yes": 1, "no": 0}}
+    )
+    dataset = transformer.map_col_values(dataset, {"sex": {"m": 1, "f": 0}})
+    dataset = transformer.transform_columns(
+        dataset, {"temp": lambda t: round(t * 9 / 5 + 32, 1)}
+    )
+    dataset = transformer.change_col_type(dataset, ["smoker"], "float")
+    dataset = transformer.change_col_type(dataset, ["smoker"], "float")
+    return transformer.apply_schema(dataset, {"smoker": "uint8", "age": "uint8"})
+
+
+def test_plan_matches_eager_methods(transformer, raw):
+    plan = (
+        transformer.pipeline(raw)
+        .remove_columns(["id"])
+        .map_col_values(
+            {"sex": {"Male": "m", "Female": "f"}, "smoker": {"yes": 1, "no": 0}}
+        )
+        .map_col_values({"sex": {"m": 1, "f": 0}})
+        .transform_columns({"temp": lambda t: round(t * 9 / 5 + 32, 1)})
+        .change_col_type(["smoker"], "float")
+        .change_col_type(["smoker"], "float")
+        .apply_schema({"smoker": "uint8", "age": "uint8"})
+    )
+
+    kept, chains = plan.optimize()
+    assert kept == ["sex", "smoker", "temp", "age"]
+    assert [op for op, _ in chains["sex"]] == ["map"]
+    assert [op for op, _ in chains["smoker"]] == ["map", "cast", "schema"]
+    pd.testing.assert_frame_equal(plan.execute(), eager(transformer, raw))
+
+
+def test_vectorized_transforms(transformer, raw):
+    plan = transformer.pipeline(raw).transform_columns(
+        {"temp": np.sqrt, "age": lambda ages: ages * 2}, vectorized=False
+    )
+    assert [op for _, op, _ in plan.steps] == ["vectorized", "apply"]
+
+    dataset = (
+        transformer.pipeline(raw)
+        .transform_columns({"age": lambda ages: ages.fillna(0) * 2}, vectorized=True)
+        .execute()
+    )
+    assert dataset["age"].tolist() == [60, 90, 0, 122, 54, 160]
+
+
+def test_removed_columns_drop_their_steps(transformer, raw):
+    plan = (
+        transformer.pipeline(raw)
+        .map_col_values({"smoker": {"yes": 1, "no": 0}})
+        .remove_columns(["smoker"])
+        .apply_schema({"smoker": "uint8"})
+    )
+
+    kept, chains = plan.optimize()
+
+    assert "smoker" not in kept and "smoker" not in chains
+    assert "smoker" not in plan.execute().columns
+
+
+def test_unknown_columns(transformer, raw):
+    plan = transformer.pipeline(raw).remove_columns(["id"])
+    with pytest.raises(SystemExit):
+        plan.map_col_values({"id": {0: 1}}).execute()
+
+
+def test_schema_rejects_fractions(transformer, raw):
+    with pytest.raises(SystemExit):
+        transformer.pipeline(raw).apply_schema({"temp": "uint8"}).execute()